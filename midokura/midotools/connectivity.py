@@ -0,0 +1,177 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+All-pairs connectivity probes.
+
+Every source VM runs a single remote command that probes all its targets
+in the background and prints one PROBE line per target, so checking N
+servers costs N ssh commands (run at the same time by the caller) instead
+of N * N tunnels. The scripts only use what the cirros busybox provides.
+"""
+
+# Port of the tcp and udp responders started on the targets
+PROBE_PORT = 50000
+
+PROTOCOLS = ('icmp', 'tcp', 'udp')
+
+# Every other server probes a target at the same time, so the responders
+# are tcpsvd and udpsvd, forking a handler per connection. When the
+# busybox does not have them the nc loops answer one connection at a
+# time (a busy one refuses the probe, which is why each probe is tried a
+# few times) and sleep when nc fails instead of spinning. The server is
+# exec'd so its pid is the one saved.
+RESPONDERS = (
+    "(if which tcpsvd >/dev/null; then exec tcpsvd -c 1000 0 {port} "
+    "echo pong; else while true; do nc -l -p {port} -e echo pong "
+    "|| sleep 1; done; fi) >/dev/null 2>&1 & echo $! > /tmp/probe_tcp.pid; "
+    "(if which udpsvd >/dev/null; then exec udpsvd -c 1000 0 {port} "
+    "echo pong; else while true; do nc -lu -p {port} -e echo pong "
+    "|| sleep 1; done; fi) >/dev/null 2>&1 & echo $! > /tmp/probe_udp.pid")
+
+STOP_RESPONDERS = ("kill $(cat /tmp/probe_tcp.pid) "
+                   "$(cat /tmp/probe_udp.pid) 2>/dev/null; "
+                   "rm -f /tmp/probe_tcp.pid /tmp/probe_udp.pid")
+
+# probe <protocol> <address> <port>, prints:
+# PROBE <protocol> <address> <port> <status> <start> <end> [<ping rtt>]
+# start and end come from /proc/uptime (10ms resolution), the rtt of the
+# icmp probes is the one ping reports
+PROBE_FUNCTION = (
+    "probe() { "
+    "for try in {attempts}; do "
+    "t0=$(cut -d' ' -f1 /proc/uptime); "
+    "case $1 in "
+    "icmp) out=$(ping -c1 -w{timeout} $2 2>&1);; "
+    "tcp) out=$(nc -w{timeout} $2 $3 </dev/null 2>&1); "
+    "echo \"$out\" | grep -q pong;; "
+    "udp) out=$(echo ping | nc -u -w{timeout} $2 $3 2>&1); "
+    "echo \"$out\" | grep -q pong;; "
+    "esac; "
+    "rc=$?; "
+    "t1=$(cut -d' ' -f1 /proc/uptime); "
+    "[ $rc -eq 0 ] && break; "
+    "done; "
+    "rtt=$(echo \"$out\" | sed -n 's#.*= [0-9.]*/\\([0-9.]*\\)/.*#\\1#p'); "
+    "echo \"PROBE $1 $2 $3 $rc $t0 $t1 $rtt\"; "
+    "}; ")
+
+
+def probe_command(addresses, protocols=('icmp',), port=PROBE_PORT,
+                  timeout=1, attempts=2):
+    """
+    :returns: the command probing all the addresses with every protocol
+              at the same time
+    """
+    for protocol in protocols:
+        if protocol not in PROTOCOLS:
+            raise ValueError("Unknown protocol %s" % protocol)
+    probes = ["probe %s %s %s &" % (protocol, address,
+                                    '-' if protocol == 'icmp' else port)
+              for address in addresses
+              for protocol in protocols]
+    return (PROBE_FUNCTION.replace('{timeout}', str(timeout))
+                          .replace('{attempts}',
+                                   ' '.join(str(i) for i in
+                                            range(1, attempts + 1))) +
+            " ".join(probes) + " wait")
+
+
+def responders_command(port=PROBE_PORT):
+    return RESPONDERS.format(port=port)
+
+
+def parse_probe_output(output):
+    """
+    :returns: a (protocol, address, port, reachable, rtt) tuple per probe,
+              port is None for icmp and rtt (in ms) None if unreachable
+    """
+    results = []
+    for line in output.splitlines():
+        fields = line.split()
+        if len(fields) < 7 or fields[0] != 'PROBE':
+            continue
+        protocol, address, port, status, start, end = fields[1:7]
+        reachable = status == '0'
+        rtt = None
+        if reachable:
+            if len(fields) > 7:
+                rtt = float(fields[7])
+            else:
+                rtt = (float(end) - float(start)) * 1000
+        results.append((protocol, address,
+                        None if port == '-' else int(port),
+                        reachable, rtt))
+    return results
+
+
+class ConnectivityMatrix(object):
+    """
+    Reachability and rtt from every source server to every address of
+    the targets. The keys are (source name, target address, protocol,
+    port), port is None for icmp.
+    """
+
+    def __init__(self):
+        self.results = {}
+        # address -> name of the server it belongs to
+        self.names = {}
+
+    def add(self, source, address, protocol, port, reachable, rtt=None):
+        self.results[(source, address, protocol, port)] = dict(
+            reachable=reachable, rtt=rtt)
+
+    def reachable(self, source, address, protocol='icmp', port=None):
+        if protocol == 'icmp':
+            port = None
+        return self.results[(source, address, protocol, port)]['reachable']
+
+    def failures(self, expected=True):
+        """
+        :returns: the sorted keys whose reachability is not the expected
+        """
+        return sorted(key for key, result in self.results.items()
+                      if result['reachable'] != expected)
+
+    def diff(self, measured):
+        """
+        Compares this matrix, holding the expected reachability, with a
+        measured one. The probes that were not measured, and the ones
+        whose expectation is unknown (None), are left out.
+        :returns: sorted (key, expected, measured) of the differences
+        """
+        differences = []
+        for key, result in sorted(self.results.items()):
+            if result['reachable'] is None or key not in measured.results:
+                continue
+            reachable = measured.results[key]['reachable']
+            if reachable != result['reachable']:
+                differences.append((key, result['reachable'], reachable))
+        return differences
+
+    def format(self):
+        lines = []
+        for key in sorted(self.results):
+            source, address, protocol, port = key
+            result = self.results[key]
+            if result['reachable'] is None:
+                state = 'unknown'
+            elif not result['reachable']:
+                state = 'unreachable'
+            elif result['rtt'] is None:
+                state = 'reachable'
+            else:
+                state = '%.2fms' % result['rtt']
+            lines.append("%s -> %s (%s) %s%s: %s" % (
+                source, address, self.names.get(address, '?'), protocol,
+                '' if port is None else '/%d' % port, state))
+        return "\n".join(lines)
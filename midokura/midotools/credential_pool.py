@@ -0,0 +1,333 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Pool of pre-provisioned tenant admin credentials.
+
+Creating isolated credentials (project, user and role assignment) for
+every tenant of every test class, and deleting them afterwards, costs
+several keystone round trips per tenant. When MIDO_CREDENTIAL_POOL points
+to a YAML file the builders lease credentials from it instead:
+
+- if the file exists it is used as is, a list of
+  {username, password, tenant_name[, tenant_id, user_id]} entries of users
+  with the admin role on their tenant.
+- if it does not, the first test process creates MIDO_CREDENTIAL_POOL_SIZE
+  (default 4) credential sets and writes the file for the other processes
+  of the run. Delete them at the end of the run with:
+
+    $ python -m midokura.midotools.credential_pool delete $MIDO_CREDENTIAL_POOL
+
+Leases are flock()s on a lock file per entry, so they are safe across
+parallel test workers and released if a worker dies. At the end of a test
+class every resource left in the tenant is deleted, but for the ones
+registered with preserve() (the tenant's access point), and the worker
+keeps the tenant for its next test class. Workers give their tenants back
+when they exit, so the pool needs at least as many entries as workers
+times tenants per test class.
+"""
+
+import argparse
+import atexit
+import fcntl
+import os
+import sys
+import threading
+import time
+
+import yaml
+
+from tempest import clients
+from tempest.common import cred_provider
+from tempest.common import credentials
+from tempest import config
+from tempest_lib import exceptions as lib_exc
+from tempest.scenario import manager
+
+from midokura.midotools import waiters
+
+CONF = config.CONF
+LOG = manager.log.getLogger(__name__)
+
+POOL_ENV = 'MIDO_CREDENTIAL_POOL'
+POOL_SIZE_ENV = 'MIDO_CREDENTIAL_POOL_SIZE'
+DEFAULT_POOL_SIZE = 4
+
+
+class Lease(object):
+
+    def __init__(self, pool, entry, lock_file):
+        self.pool = pool
+        self.entry = entry
+        self.lock_file = lock_file
+        self.credentials = cred_provider.get_credentials(**entry)
+
+    def release(self):
+        """
+        Called at the end of a test class, the tenant is scrubbed (but
+        for the preserved resources) and kept by this worker for the
+        next class
+        """
+        try:
+            scrub_tenant(self.credentials,
+                         keep=_preserved.get(self.credentials.tenant_id))
+        except Exception:
+            LOG.exception("Failed to scrub tenant %s",
+                          self.entry['tenant_name'])
+        self.pool._idle.append(self)
+
+    def close(self):
+        try:
+            scrub_tenant(self.credentials)
+        except Exception:
+            LOG.exception("Failed to scrub tenant %s",
+                          self.entry['tenant_name'])
+        finally:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+            self.lock_file.close()
+            LOG.info("Released credentials of tenant %s",
+                     self.entry['tenant_name'])
+
+
+class CredentialPool(object):
+
+    def __init__(self, path, size=DEFAULT_POOL_SIZE):
+        self.path = os.path.abspath(path)
+        self.size = size
+        self._entries = None
+        self._lock = threading.Lock()
+        # leases released by a test class but still held by this worker
+        self._idle = []
+        self._atexit = False
+
+    @property
+    def entries(self):
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._load_or_create()
+        return self._entries
+
+    def _load_or_create(self):
+        # Serialize the creation between the test workers, the first one
+        # creates the credentials and the rest read them
+        with open(self.path + '.lock', 'a') as creation_lock:
+            fcntl.flock(creation_lock, fcntl.LOCK_EX)
+            try:
+                if not os.path.exists(self.path):
+                    entries = create_credentials(self.size)
+                    with open(self.path, 'w') as pool_file:
+                        yaml.safe_dump(entries, pool_file,
+                                       default_flow_style=False)
+                with open(self.path, 'r') as pool_file:
+                    return yaml.safe_load(pool_file)
+            finally:
+                fcntl.flock(creation_lock, fcntl.LOCK_UN)
+
+    def _lock_path(self, index):
+        return '%s.%d.lock' % (self.path, index)
+
+    def lease(self, timeout=None):
+        """
+        :returns: a Lease with the credentials of a tenant no other
+                  builder is using, waiting for one to be released
+        """
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+            if not self._atexit:
+                atexit.register(self.close_all)
+                self._atexit = True
+        timeout = timeout or CONF.compute.build_timeout
+        start = time.time()
+        while True:
+            for index, entry in enumerate(self.entries):
+                lock_file = open(self._lock_path(index), 'a')
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except IOError:
+                    lock_file.close()
+                    continue
+                LOG.info("Leased credentials of tenant %s",
+                         entry['tenant_name'])
+                return Lease(self, entry, lock_file)
+            if time.time() - start > timeout:
+                raise lib_exc.TimeoutException(
+                    "No free credentials in %s after %ds"
+                    % (self.path, timeout))
+            time.sleep(1)
+
+    def close_all(self):
+        while self._idle:
+            self._idle.pop().close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# tenant id -> ids (or keypair names) of the resources the scrub keeps
+_preserved = {}
+
+
+def preserve(tenant_id, resources):
+    _preserved.setdefault(tenant_id, set()).update(resources)
+
+
+def forget(tenant_id):
+    _preserved.pop(tenant_id, None)
+
+
+def get_pool():
+    """
+    :returns: the CredentialPool of this run, None if it is not enabled
+    """
+    global _pool
+    path = os.environ.get(POOL_ENV)
+    if not path:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            size = int(os.environ.get(POOL_SIZE_ENV, DEFAULT_POOL_SIZE))
+            _pool = CredentialPool(path, size)
+    return _pool
+
+
+def create_credentials(size):
+    entries = []
+    for index in range(size):
+        # The isolated credentials are never cleared, they live as long
+        # as the pool file
+        iso_creds = credentials.get_isolated_credentials(
+            'midokura-pool-%d' % index)
+        creds = iso_creds.get_credentials('admin')
+        entries.append(dict(username=creds.username,
+                            password=creds.password,
+                            tenant_name=creds.tenant_name,
+                            tenant_id=creds.tenant_id,
+                            user_id=creds.user_id))
+        LOG.info("Created pool credentials for tenant %s", creds.tenant_name)
+    return entries
+
+
+def delete_credentials(path):
+    identity_client = clients.AdminManager().identity_client
+    with open(path, 'r') as pool_file:
+        entries = yaml.safe_load(pool_file)
+    for entry in entries:
+        creds = cred_provider.get_credentials(**entry)
+        scrub_tenant(creds)
+        for delete, resource_id in [
+                (identity_client.delete_user, entry.get('user_id')),
+                (identity_client.delete_tenant, entry.get('tenant_id'))]:
+            if resource_id:
+                _ignore_not_found(delete, resource_id)
+    os.remove(path)
+
+
+def _ignore_not_found(delete, *args, **kwargs):
+    try:
+        delete(*args, **kwargs)
+    except lib_exc.NotFound:
+        pass
+
+
+def _kept(resource, keep):
+    return any(resource.get(key) in keep
+               for key in ['id', 'name', 'device_id', 'network_id'])
+
+
+def scrub_tenant(creds, keep=None):
+    """
+    Deletes every resource of the credentials' tenant. The users are
+    tenant admins, so every list is filtered by tenant.
+    :param keep: ids of the resources (and of the devices and networks
+    of the ports) to leave alone
+    """
+    keep = keep or set()
+    mymanager = clients.Manager(credentials=creds)
+    tenant_id = creds.tenant_id
+    network_client = mymanager.network_client
+    servers_client = mymanager.servers_client
+
+    servers = [server for server in servers_client.list_servers()['servers']
+               if not _kept(server, keep)]
+    waiter = waiters.server_waiter(servers_client,
+                                   CONF.compute.build_timeout)
+    for server in servers:
+        _ignore_not_found(servers_client.delete_server, server['id'])
+        waiter.add(server['id'], waiters.DELETED)
+    waiter.wait()
+    for keypair in mymanager.keypairs_client.list_keypairs():
+        if _kept(keypair['keypair'], keep):
+            continue
+        _ignore_not_found(mymanager.keypairs_client.delete_keypair,
+                          keypair['keypair']['name'])
+
+    for kind in ['vip', 'health_monitor', 'member', 'pool', 'floatingip']:
+        try:
+            resources = getattr(network_client, 'list_%ss' % kind)(
+                tenant_id=tenant_id)['%ss' % kind]
+        except lib_exc.NotFound:
+            # lbaas extension not enabled
+            continue
+        for resource in resources:
+            if _kept(resource, keep):
+                continue
+            _ignore_not_found(getattr(network_client, 'delete_%s' % kind),
+                              resource['id'])
+
+    for router in network_client.list_routers(
+            tenant_id=tenant_id)['routers']:
+        if _kept(router, keep):
+            continue
+        interfaces = network_client.list_ports(
+            device_id=router['id'],
+            device_owner='network:router_interface')['ports']
+        for port in interfaces:
+            _ignore_not_found(
+                network_client.remove_router_interface_with_port_id,
+                router['id'], port['id'])
+        _ignore_not_found(network_client.delete_router, router['id'])
+
+    for kind in ['port', 'subnet', 'network']:
+        resources = getattr(network_client, 'list_%ss' % kind)(
+            tenant_id=tenant_id)['%ss' % kind]
+        for resource in resources:
+            if (resource.get('device_owner', '').startswith('network:') or
+                    _kept(resource, keep)):
+                # dhcp ports go away with their network
+                continue
+            _ignore_not_found(getattr(network_client, 'delete_%s' % kind),
+                              resource['id'])
+
+    for secgroup in network_client.list_security_groups(
+            tenant_id=tenant_id)['security_groups']:
+        if secgroup['name'] != 'default' and not _kept(secgroup, keep):
+            _ignore_not_found(network_client.delete_security_group,
+                              secgroup['id'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Manage the pre-provisioned credential pool")
+    parser.add_argument('action', choices=['create', 'delete'])
+    parser.add_argument('path', help="credential pool YAML file")
+    parser.add_argument('--size', type=int, default=DEFAULT_POOL_SIZE)
+    args = parser.parse_args(argv)
+    if args.action == 'create':
+        CredentialPool(args.path, args.size).entries
+    else:
+        delete_credentials(args.path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,70 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+DHCP lease measurements on the cirros VMs.
+"""
+
+from midokura.midotools import helper
+
+# The running udhcpc renews its lease on SIGUSR1 (REQUEST/ACK, the
+# interface stays configured, so the ssh session survives), and its
+# script (the cirros one applies the host routes and the DNS) rewrites
+# resolv.conf once the ACK is in. The signal returns right away, so the
+# renewal is timed with /proc/uptime until resolv.conf changes, polled
+# every 100ms in the same ssh command, then the routing table and
+# resolv.conf are printed. The status is 0 once renewed, 1 on timeout
+# and 2 without a running udhcpc.
+LEASE = (
+    "pid=$(ps | grep '[u]dhcpc' | head -n 1 | awk '{{print $1}}'); "
+    "mtime() {{ stat -c %Y /etc/resolv.conf 2>/dev/null; }}; "
+    "before=$(mtime); "
+    "t0=$(cut -d' ' -f1 /proc/uptime); "
+    "rc=2; [ -n \"$pid\" ] && sudo kill -USR1 $pid && rc=1; "
+    "i=0; while [ $rc = 1 ] && [ $i -lt {polls} ]; do "
+    "[ \"$(mtime)\" != \"$before\" ] && rc=0 && break; "
+    "usleep 100000; i=$((i + 1)); done; "
+    "t1=$(cut -d' ' -f1 /proc/uptime); "
+    "echo \"LEASE $rc $t0 $t1\"; "
+    "/sbin/route -n; grep nameserver /etc/resolv.conf; true")
+
+
+def lease_command(timeout=30):
+    """
+    :param timeout: seconds to wait for the renewal
+    """
+    return LEASE.format(polls=timeout * 10)
+
+
+def parse_lease_output(output):
+    """
+    :returns: dict telling whether the lease was renewed (acquired), the
+              seconds it took, the routes (helper.Routetable) and the
+              name servers the VM ended up with
+    """
+    lines = output.splitlines()
+    lease = [line.split() for line in lines if line.startswith('LEASE ')]
+    status, start, end = lease[-1][1:4] if lease else (None, None, None)
+    routes = []
+    for index, line in enumerate(lines):
+        if line.startswith('Kernel IP routing table'):
+            routes = helper.Routetable.build_route_table("\n".join(
+                route for route in lines[index:]
+                if not route.startswith('nameserver')))
+            break
+    return dict(acquired=status == '0',
+                seconds=(round(float(end) - float(start), 2)
+                         if lease else None),
+                routes=routes,
+                dns=[line.split()[1] for line in lines
+                     if line.startswith('nameserver') and
+                     len(line.split()) > 1])
@@ -0,0 +1,59 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import sys
+import threading
+
+import six
+from six.moves import queue
+
+
+def run_concurrently(func, items, workers=None):
+    """
+    Calls func(item) for every item from a pool of threads.
+    Meant for the API and ssh calls of the tests, which spend their
+    time waiting on the network.
+
+    :param workers: maximum number of threads, one per item by default
+    :returns: the results, in the same order as the items
+    :raises: the exception of the first failed item (by position), once
+             every item has finished
+    """
+    items = list(items)
+    results = [None] * len(items)
+    errors = []
+    pending = queue.Queue()
+    for index, item in enumerate(items):
+        pending.put((index, item))
+
+    def worker():
+        while True:
+            try:
+                index, item = pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                results[index] = func(item)
+            except Exception:
+                errors.append((index, sys.exc_info()))
+
+    threads = [threading.Thread(target=worker)
+               for _ in range(min(workers or len(items), len(items)))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        _, exc_info = min(errors, key=lambda error: error[0])
+        six.reraise(*exc_info)
+    return results
@@ -0,0 +1,181 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Continuous probes running while a test changes the topology, to time
+how long the change takes to reach the datapath.
+
+A Prober records a timestamped sample per probe in the background, the
+test marks the moment of its API calls, and the convergence times are
+computed from the samples afterwards.
+"""
+
+import threading
+import time
+
+from tempest.scenario import manager
+
+LOG = manager.log.getLogger(__name__)
+
+
+class Prober(object):
+    """
+    Calls probe() over and over from a background thread, recording
+    (timestamp, result) samples. A probe raising an exception records a
+    None result, like a failed probe is expected to return.
+    """
+
+    def __init__(self, probe, interval=0.2, name='probe'):
+        self.probe = probe
+        self.interval = interval
+        self.name = name
+        self.marks = {}
+        self._samples = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        :returns: the samples
+        """
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        return self.samples()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            started = time.time()
+            try:
+                result = self.probe()
+            except Exception as e:
+                LOG.debug("%s failed: %s", self.name, e)
+                result = None
+            with self._lock:
+                self._samples.append((started, result))
+            self._stopped.wait(max(0, self.interval -
+                                   (time.time() - started)))
+
+    def samples(self):
+        with self._lock:
+            return list(self._samples)
+
+    def last(self):
+        """
+        :returns: the result of the latest probe, None before the first
+        """
+        with self._lock:
+            return self._samples[-1][1] if self._samples else None
+
+    def mark(self, name):
+        """
+        Records the time of an event, e.g. right before an API call
+        :returns: the time
+        """
+        self.marks[name] = time.time()
+        return self.marks[name]
+
+
+def first_after(samples, since, predicate):
+    """
+    :returns: the time of the first sample from since on whose result
+              matches the predicate, None if there is none
+    """
+    for when, result in samples:
+        if when >= since and predicate(result):
+            return when
+    return None
+
+
+def settled_after(samples, since, predicate, until=None):
+    """
+    :returns: the time of the first sample from since on after which
+              every result (until `until`) matches the predicate, None if
+              the last one does not
+    """
+    settled = None
+    for when, result in samples:
+        if when < since or (until is not None and when >= until):
+            continue
+        if predicate(result):
+            if settled is None:
+                settled = when
+        else:
+            settled = None
+    return settled
+
+
+def count_between(samples, start, end, predicate):
+    """
+    :returns: the number of samples between start and end whose result
+              matches the predicate
+    """
+    return len([result for when, result in samples
+                if start <= when < end and predicate(result)])
+
+
+def outages(samples, failed=lambda result: result is None):
+    """
+    :returns: (start, end, lost) of every run of failed samples, from the
+              first failed probe to the next successful one (end is None
+              when the probes never recovered)
+    """
+    runs = []
+    start = None
+    lost = 0
+    for when, result in samples:
+        if failed(result):
+            if start is None:
+                start = when
+            lost += 1
+        elif start is not None:
+            runs.append((start, when, lost))
+            start = None
+            lost = 0
+    if start is not None:
+        runs.append((start, None, lost))
+    return runs
+
+
+def downtime(samples, start, end, failed=lambda result: result is None):
+    """
+    :returns: dict with the probes between start and end and how many
+              failed, the seconds of all the outages and of the longest
+              one, when the last outage ended ('recovered', None when
+              there was none or it lasted past the end) and whether it
+              lasted past the end ('not_recovered')
+    """
+    window = [(when, result) for when, result in samples
+              if start <= when < end]
+    runs = outages(window, failed)
+    durations = [(stop or end) - begin for begin, stop, _ in runs]
+    return dict(probes=len(window),
+                lost=sum(lost for _, _, lost in runs),
+                downtime_s=round(sum(durations), 2),
+                longest_s=round(max(durations), 2) if durations else 0.0,
+                recovered=runs[-1][1] if runs else None,
+                not_recovered=bool(runs) and runs[-1][1] is None)
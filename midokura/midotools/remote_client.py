@@ -10,6 +10,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import re
+
 import six
 
 from tempest import config
@@ -23,6 +25,10 @@ import midokura.midotools.ssh as ssh
 CONF = config.CONF
 LOG = manager.log.getLogger(__name__)
 
+# per packet lines of ping: "64 bytes from ...: seq=0 ttl=64 time=0.512 ms"
+TIME_RE = re.compile(r'seq=\d+ .*time=([\d.]+) ms')
+TCP_RTT_RE = re.compile(r'TCPRTT ([\d.]+) ([\d.]+)')
+
 
 class RemoteClient(remote_client.RemoteClient):
     """
@@ -52,3 +58,42 @@ class RemoteClient(remote_client.RemoteClient):
 
     def exec_command(self, cmd, cmd_timeout=0):
         return self.ssh_client.exec_command(cmd, cmd_timeout)
+
+    def latency_series(self, host, count=100, interval=None, size=56,
+                       protocol='icmp', port=None):
+        """
+        Measures the rtt of `count` packets to the host
+        :param interval: seconds between packets, the ping default (1s)
+        when None
+        :param protocol: 'icmp' pings the host, 'tcp' times connections
+        to a responder listening on `port` of the host (see
+        connectivity.RESPONDERS), with 10ms resolution
+        :returns: the rtt (in ms) of every answered packet, in order
+        """
+        if protocol == 'icmp':
+            cmd = "ping -c{0} -s{1}".format(count, size)
+            if interval:
+                cmd += " -i{0}".format(interval)
+            # a host that does not answer is a result, not an error
+            cmd += " {0} || true".format(host)
+            pattern = TIME_RE
+        elif protocol == 'tcp':
+            cmd = ("i=0; while [ $i -lt {0} ]; do i=$((i+1)); "
+                   "t0=$(cut -d' ' -f1 /proc/uptime); "
+                   "nc -w1 {1} {2} </dev/null 2>&1 | grep -q pong && "
+                   "echo \"TCPRTT $t0 $(cut -d' ' -f1 /proc/uptime)\"; "
+                   "sleep {3}; done").format(count, host, port,
+                                             interval or 1)
+            pattern = TCP_RTT_RE
+        else:
+            raise ValueError("Unknown protocol %s" % protocol)
+        output = self.exec_command(
+            cmd, cmd_timeout=count * (interval or 1) + 60)
+        rtts = []
+        for match in pattern.finditer(output):
+            if protocol == 'icmp':
+                rtts.append(float(match.group(1)))
+            else:
+                rtts.append((float(match.group(2)) -
+                             float(match.group(1))) * 1000)
+        return rtts
@@ -0,0 +1,58 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Machine readable results of the benchmark scenarios.
+
+The results are attached to the test output as a JSON detail, and when
+MIDO_BENCHMARK_RESULTS points to a file they are appended to it too, one
+JSON record per line, so the numbers of different builds can be compared.
+"""
+
+import fcntl
+import json
+import os
+import time
+
+from testtools import content
+
+from tempest.scenario import manager
+
+LOG = manager.log.getLogger(__name__)
+
+RESULTS_ENV = 'MIDO_BENCHMARK_RESULTS'
+
+
+def publish(test, name, results):
+    """
+    :param test: the running test case
+    :param name: name of the benchmark, the detail is named after it
+    :param results: anything json serializable
+    :returns: the published record
+    """
+    record = dict(test=test.id(),
+                  name=name,
+                  timestamp=time.time(),
+                  results=results)
+    text = json.dumps(record, sort_keys=True)
+    test.addDetail(name, content.text_content(text))
+    LOG.info("Benchmark %s: %s", name, text)
+    path = os.environ.get(RESULTS_ENV)
+    if path:
+        with open(path, 'a') as results_file:
+            # the parallel test workers append to the same file
+            fcntl.flock(results_file, fcntl.LOCK_EX)
+            try:
+                results_file.write(text + '\n')
+            finally:
+                fcntl.flock(results_file, fcntl.LOCK_UN)
+    return record
@@ -46,6 +46,22 @@ class SSHExecCommandFailed(exceptions.TempestException):
                "Error:\n%(strerror)s")
 
 
+def generate_rsa_keypair(bits=2048):
+    """
+    Generates a keypair locally, to be imported in nova
+    :returns: (private key, public key) in PEM and OpenSSH formats
+    """
+    key = paramiko.RSAKey.generate(bits)
+    private_key = cStringIO.StringIO()
+    key.write_private_key(private_key)
+    _pkey_cache[private_key.getvalue()] = key
+    return private_key.getvalue(), "ssh-rsa %s" % key.get_base64()
+
+
+# Parsed private keys, the servers of a tenant share the same keypair
+_pkey_cache = {}
+
+
 class Client(object):
 
     def __init__(self, host, username, password=None, timeout=300, pkey=None,
@@ -237,8 +253,10 @@ class Client(object):
     @staticmethod
     def _fix_pkey(pkey):
         if isinstance(pkey, six.string_types):
-            pkey = paramiko.RSAKey.from_private_key(
-                cStringIO.StringIO(str(pkey)))
+            if pkey not in _pkey_cache:
+                _pkey_cache[pkey] = paramiko.RSAKey.from_private_key(
+                    cStringIO.StringIO(str(pkey)))
+            pkey = _pkey_cache[pkey]
         return pkey
 
     def exec_command(self, cmd, cmd_timeout=0):
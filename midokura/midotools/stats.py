@@ -0,0 +1,152 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Summary statistics of the benchmark samples, and the significance tests
+of the sequential checks.
+"""
+
+import math
+
+
+def percentile(values, p):
+    """
+    :param values: the samples, sorted
+    :param p: percentile, between 0 and 100
+    :returns: the linear interpolation between the closest ranks
+    """
+    if not values:
+        return None
+    rank = (len(values) - 1) * p / 100.0
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+def jitter(values):
+    """
+    :param values: the samples, in the order they were taken
+    :returns: the mean difference between consecutive samples
+    """
+    if len(values) < 2:
+        return 0.0
+    return (sum(abs(b - a) for a, b in zip(values, values[1:])) /
+            float(len(values) - 1))
+
+
+def summarize(values, sent=None, digits=3):
+    """
+    :param values: the samples, in the order they were taken
+    :param sent: number of attempts, to report the loss of the samples
+                 that never came back
+    :returns: dict with count, min, p50, p90, p99, max, mean and jitter
+    """
+    ordered = sorted(values)
+    summary = dict(count=len(values),
+                   min=ordered[0] if ordered else None,
+                   p50=percentile(ordered, 50),
+                   p90=percentile(ordered, 90),
+                   p99=percentile(ordered, 99),
+                   max=ordered[-1] if ordered else None,
+                   mean=sum(values) / float(len(values)) if values else None,
+                   jitter=jitter(values))
+    if sent is not None:
+        summary['sent'] = sent
+        summary['loss'] = 1 - len(values) / float(sent) if sent else None
+    return dict((key, round(value, digits) if isinstance(value, float)
+                 else value)
+                for key, value in summary.items())
+
+
+def normal_quantile(alpha):
+    """
+    :returns: z such that a standard normal exceeds it with probability
+              alpha
+    """
+    low, high = -10.0, 10.0
+    while high - low > 1e-6:
+        middle = (low + high) / 2
+        if 0.5 * math.erfc(middle / math.sqrt(2)) > alpha:
+            low = middle
+        else:
+            high = middle
+    return (low + high) / 2
+
+
+def chi_square(counts):
+    """
+    :returns: Pearson's statistic of the counts against a uniform
+              distribution
+    """
+    expected = sum(counts) / float(len(counts))
+    return sum((count - expected) ** 2 / expected for count in counts)
+
+
+def share_interval(count, total, alpha):
+    """
+    :returns: (low, high) Wilson score interval of the share count/total
+              at confidence 1 - alpha
+    """
+    z = normal_quantile(alpha / 2)
+    share = count / float(total)
+    scale = 1 + z * z / total
+    center = (share + z * z / (2 * total)) / scale
+    half = z * math.sqrt(share * (1 - share) / total +
+                         z * z / (4 * total * total)) / scale
+    return center - half, center + half
+
+
+def uniformity_verdict(counts, alpha, tolerance=0.5):
+    """
+    Sequential equivalence check of a uniform distribution, asked after
+    every sample. Uniform means every share within tolerance of 1/k,
+    i.e. in [(1 - tolerance) / k, (1 + tolerance) / k]: failing to
+    reject a chi-square test is no evidence of that, so the shares are
+    bounded instead, with an interval per category at confidence
+    1 - alpha/k.
+    :param counts: the samples of every category
+    :param alpha: error of either verdict, small enough to stand the
+                  repeated looks
+    :returns: True once every share is inside the tolerance, False once
+              one is outside it, None while undecided
+    """
+    if len(counts) < 2:
+        return bool(counts and counts[0])
+    total = sum(counts)
+    if not total:
+        return None
+    low = (1 - tolerance) / len(counts)
+    high = (1 + tolerance) / len(counts)
+    intervals = [share_interval(count, total, alpha / len(counts))
+                 for count in counts]
+    if any(top < low or bottom > high for bottom, top in intervals):
+        return False
+    if all(low <= bottom and top <= high for bottom, top in intervals):
+        return True
+    return None
+
+
+def persistence_verdict(counts, alpha):
+    """
+    Sequential check that every sample falls in the same category.
+    :returns: False as soon as two categories have samples, True once
+              the chance of a uniform distribution putting all the
+              samples in one category, (1/k)^(n-1), is below alpha, None
+              while undecided
+    """
+    if len([count for count in counts if count]) > 1:
+        return False
+    if len(counts) < 2:
+        return True
+    if (1.0 / len(counts)) ** (sum(counts) - 1) < alpha:
+        return True
+    return None
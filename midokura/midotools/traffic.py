@@ -0,0 +1,338 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Traffic generators for the benchmark scenarios, with the cirros busybox.
+
+- bulk streams: dd piped to nc, the sink counts the bytes it receives
+  with wc and the source times the stream.
+- connection setup rate: an uploaded client loop opening short
+  connections to a forking responder.
+
+Times come from /proc/uptime (10ms resolution).
+"""
+
+from midokura.midotools import stats
+
+STREAM_PORT = 5001
+
+# The nc pid is saved, killing it makes wc write the count. The sink
+# gets a second to start listening before the source connects.
+SINK = ("rm -f /tmp/bench_rx; "
+        "(sh -c 'echo $$ > /tmp/bench_sink.pid; exec nc -l{udp} -p {port}' "
+        "| wc -c > /tmp/bench_rx) >/dev/null 2>&1 & sleep 1")
+
+# The udp sink never sees the end of the stream, it is stopped after it
+STOP_SINK = ("kill $(cat /tmp/bench_sink.pid) 2>/dev/null; "
+             "for i in 1 2 3 4 5; do [ -s /tmp/bench_rx ] && break; "
+             "sleep 1; done; cat /tmp/bench_rx")
+
+# nc waits NC_LINGER seconds for final reads once dd is done
+NC_LINGER = 1
+
+SOURCE = ("t0=$(cut -d' ' -f1 /proc/uptime); "
+          "dd if=/dev/zero bs={block} count={count} 2>/dev/null "
+          "| nc {udp_flag}-w {linger} {address} {port}; rc=$?; "
+          "t1=$(cut -d' ' -f1 /proc/uptime); "
+          "echo \"STREAM $rc {size} $t0 $t1\"")
+
+
+def sink_command(protocol, port=STREAM_PORT):
+    return SINK.format(udp='u' if protocol == 'udp' else '', port=port)
+
+
+def source_command(protocol, address, size, port=STREAM_PORT, block=None):
+    """
+    :param size: bytes to send, rounded down to whole blocks
+    :param block: write size, defaults to 64KB for tcp and 1400 bytes
+                  (one datagram below the MTU) for udp
+    """
+    if block is None:
+        block = 1400 if protocol == 'udp' else 65536
+    count = size // block
+    return SOURCE.format(block=block, count=count, size=block * count,
+                         udp_flag='-u ' if protocol == 'udp' else '',
+                         linger=NC_LINGER, address=address, port=port)
+
+
+def stream_result(protocol, source_output, sink_output):
+    """
+    :returns: dict with the bytes sent and received, the seconds the
+              stream took, the goodput in Mbit/s and the fraction of the
+              bytes lost
+    """
+    line = [l for l in source_output.splitlines()
+            if l.startswith('STREAM ')][-1]
+    status, sent, start, end = line.split()[1:5]
+    sent = int(sent)
+    received = int(sink_output.strip() or 0)
+    seconds = float(end) - float(start)
+    if protocol == 'udp':
+        # the source keeps waiting for replies after sending
+        seconds -= NC_LINGER
+    seconds = max(seconds, 0.01)
+    return dict(protocol=protocol,
+                status=int(status),
+                bytes_sent=sent,
+                bytes_received=received,
+                seconds=round(seconds, 2),
+                goodput_mbps=round(received * 8 / seconds / 1e6, 2),
+                loss=round(1 - float(received) / sent, 4) if sent else None)
+
+
+"""
+Connection setup rate
+"""
+
+RATE_PORT = 5002
+
+# tcpsvd and udpsvd fork a handler per connection, when the busybox does
+# not have them the nc loops serve one connection at a time. The server
+# is exec'd so its pid is the one saved.
+RATE_SERVER = (
+    "(if which tcpsvd >/dev/null; then exec tcpsvd -c 1000 0 {port} "
+    "echo pong; else while true; do nc -l -p {port} -e echo pong "
+    "|| sleep 1; done; fi) >/dev/null 2>&1 & echo $! > /tmp/rate_tcp.pid; "
+    "(if which udpsvd >/dev/null; then exec udpsvd -c 1000 0 {port} "
+    "echo pong; else while true; do nc -lu -p {port} -e echo pong "
+    "|| sleep 1; done; fi) >/dev/null 2>&1 & echo $! > /tmp/rate_udp.pid")
+
+STOP_RATE_SERVER = ("kill $(cat /tmp/rate_tcp.pid) $(cat /tmp/rate_udp.pid) "
+                    "2>/dev/null; rm -f /tmp/rate_tcp.pid /tmp/rate_udp.pid")
+
+# Every worker opens one connection after the other until the deadline.
+# A connection succeeds when the first line of the answer is pong, its
+# first packet latency is the time until that line arrives. Times are
+# /proc/uptime centiseconds. The udp client lingers for a second after
+# the answer (nc -w1), so udp needs more workers for the same rate.
+CONNECTION_CLIENT = r"""#!/bin/sh
+# usage: connrate.sh <tcp|udp> <host> <port> <seconds> <workers>
+proto=$1; host=$2; port=$3; duration=$4; workers=$5
+now() { cut -d' ' -f1 /proc/uptime | tr -d .; }
+end=$(($(now) + duration * 100))
+connect() {
+    if [ $proto = udp ]; then
+        echo ping | nc -u -w1 $host $port
+    else
+        nc -w1 $host $port </dev/null
+    fi
+}
+worker() {
+    while [ $(now) -lt $end ]; do
+        t0=$(now)
+        connect 2>/dev/null | {
+            if read line && [ "$line" = pong ]; then
+                echo "CONN 1 $t0 $(now)"
+            else
+                echo "CONN 0 $t0 $(now)"
+            fi
+        }
+    done
+}
+i=0
+while [ $i -lt $workers ]; do worker & i=$((i + 1)); done
+wait
+"""
+
+CONNECTION_CLIENT_PATH = '/tmp/connrate.sh'
+
+
+def rate_server_command(port=RATE_PORT):
+    return RATE_SERVER.format(port=port)
+
+
+def upload_command(path, script):
+    """
+    :returns: the command writing the script to path on the VM
+    """
+    return "cat > {0} <<'MIDO_EOF'\n{1}MIDO_EOF\nchmod +x {0}".format(
+        path, script)
+
+
+def connection_rate_command(protocol, address, seconds, workers,
+                            port=RATE_PORT):
+    return "{0} {1} {2} {3} {4} {5}".format(
+        CONNECTION_CLIENT_PATH, protocol, address, port, seconds, workers)
+
+
+def connection_rate_result(protocol, output, seconds):
+    """
+    :returns: dict with the connections attempted and established, the
+              failure rate, the mean rate of established connections per
+              second, the established connections of every whole second
+              and the first packet latency (ms) of the established ones
+    """
+    attempts = []
+    for line in output.splitlines():
+        fields = line.split()
+        if len(fields) == 4 and fields[0] == 'CONN':
+            attempts.append((fields[1] == '1', int(fields[2]),
+                             int(fields[3])))
+    established = [(start, end) for ok, start, end in attempts if ok]
+    per_second = {}
+    for _, end in established:
+        per_second[end // 100] = per_second.get(end // 100, 0) + 1
+    # the first and last seconds are partial
+    whole_seconds = sorted(per_second)[1:-1]
+    return dict(
+        protocol=protocol,
+        seconds=seconds,
+        attempts=len(attempts),
+        established=len(established),
+        failure_rate=(round(1 - len(established) / float(len(attempts)), 4)
+                      if attempts else None),
+        connections_per_second=round(len(established) / float(seconds), 2),
+        per_second=stats.summarize([per_second[s] for s in whole_seconds]),
+        first_packet_ms=stats.summarize([(end - start) * 10.0
+                                         for start, end in established]))
+
+
+"""
+Load balancer load
+"""
+
+# Every worker sends its share of the requests one after the other, each
+# request records its start, the arrival of the first line of the answer
+# and the line itself ("-" when nothing came back).
+LOAD_CLIENT = r"""host=%(host)s; port=%(port)d
+requests=%(requests)d; workers=%(workers)d
+now() { cut -d' ' -f1 /proc/uptime | tr -d .; }
+worker() {
+    n=$1
+    while [ $n -gt 0 ]; do
+        n=$((n - 1))
+        t0=$(now)
+        nc -w%(timeout)d $host $port </dev/null 2>/dev/null | {
+            read line
+            echo "REQ $t0 $(now) ${line:--}"
+        }
+    done
+}
+i=0
+while [ $i -lt $workers ]; do
+    worker $(((requests + workers - 1 - i) / workers)) &
+    i=$((i + 1))
+done
+wait
+"""
+
+
+def load_command(address, port, requests, workers, timeout=2):
+    """
+    :returns: the command sending `requests` requests to address:port
+              with `workers` connections in parallel. It runs on the
+              cirros VMs as well as on the tempest host.
+    """
+    return LOAD_CLIENT % dict(host=address, port=port, requests=requests,
+                              workers=min(workers, requests),
+                              timeout=timeout)
+
+
+def parse_load_output(output):
+    """
+    :returns: a (start, end, answer) tuple per request, times in
+              seconds of the client's uptime, answer None on failure
+    """
+    requests = []
+    for line in output.splitlines():
+        fields = line.split(None, 3)
+        if len(fields) == 4 and fields[0] == 'REQ':
+            answer = fields[3].strip()
+            requests.append((int(fields[1]) / 100.0, int(fields[2]) / 100.0,
+                             None if answer == '-' else answer))
+    return requests
+
+
+def load_result(outputs, backends):
+    """
+    :param outputs: the output of the load command on every client
+    :param backends: the names the backends answer with
+    :returns: dict with the hits of every backend, the failures (no
+              answer, or an unknown one), the latency (ms) of the
+              answered requests and the requests per second
+    """
+    hits = dict.fromkeys(backends, 0)
+    failures = 0
+    latencies = []
+    seconds = 0.0
+    for output in outputs:
+        requests = parse_load_output(output)
+        if not requests:
+            continue
+        seconds = max(seconds, max(end for _, end, _ in requests) -
+                      min(start for start, _, _ in requests))
+        for start, end, answer in requests:
+            if answer in hits:
+                hits[answer] += 1
+                latencies.append((end - start) * 1000)
+            else:
+                failures += 1
+    total = sum(hits.values()) + failures
+    return dict(requests=total,
+                hits=hits,
+                failures=failures,
+                seconds=round(seconds, 2),
+                requests_per_second=(round(total / seconds, 2)
+                                     if seconds else None),
+                latency_ms=stats.summarize(latencies))
+
+
+"""
+Load balancer backend
+"""
+
+# The pool members answer every connection with their name and count it
+# with a line in /tmp/lb_served (appending a line is atomic). tcpsvd
+# forks a handler per connection, when the busybox does not have it an
+# nc loop respawns right after every connection. The pids of the server
+# and of the listening nc are saved to stop them, and only them.
+BACKEND = r"""#!/bin/sh
+# usage: lb_backend.sh <name> <port>
+name=$1; port=$2
+rm -f /tmp/lb_served
+cat > /tmp/lb_answer.sh <<ANSWER_EOF
+#!/bin/sh
+echo $name
+echo >> /tmp/lb_served
+ANSWER_EOF
+chmod +x /tmp/lb_answer.sh
+if which tcpsvd >/dev/null; then
+    exec tcpsvd -c 1000 0 $port /tmp/lb_answer.sh
+fi
+while true; do
+    nc -l -p $port -e /tmp/lb_answer.sh &
+    echo $! > /tmp/lb_nc.pid
+    wait $!
+done
+"""
+
+BACKEND_PATH = '/tmp/lb_backend.sh'
+
+START_BACKEND = ("{path} {name} {port} >/dev/null 2>&1 & "
+                 "echo $! > /tmp/lb_backend.pid")
+
+STOP_BACKEND = ("kill $(cat /tmp/lb_backend.pid) 2>/dev/null; "
+                "kill $(cat /tmp/lb_nc.pid) 2>/dev/null; "
+                "rm -f /tmp/lb_backend.pid /tmp/lb_nc.pid; true")
+
+# The requests served since the backend was started
+BACKEND_SERVED = "cat /tmp/lb_served 2>/dev/null | wc -l"
+
+
+def backend_command(name, port):
+    """
+    :returns: the command uploading and starting the responder of a pool
+              member in the background
+    """
+    return "{0}; {1}".format(
+        upload_command(BACKEND_PATH, BACKEND),
+        START_BACKEND.format(path=BACKEND_PATH, name=name, port=port))
@@ -0,0 +1,215 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import time
+
+from tempest_lib import exceptions as lib_exc
+from tempest.scenario import manager
+
+LOG = manager.log.getLogger(__name__)
+
+# Status of the resources that are not listed any more
+DELETED = 'DELETED'
+
+
+class WaitError(lib_exc.TempestException):
+    message = "%(kind)s %(resource_id)s went to status %(status)s"
+
+
+class PollResult(object):
+    """
+    Outcome of poll(), true when the condition got to the expected value
+    """
+
+    def __init__(self, success, elapsed, attempts):
+        self.success = success
+        # seconds until the condition flipped to the expected value
+        # (the start of the final stable streak), or until giving up
+        self.elapsed = elapsed
+        self.attempts = attempts
+
+    def __nonzero__(self):
+        return self.success
+
+    __bool__ = __nonzero__
+
+    def __repr__(self):
+        return "PollResult(success=%s, elapsed=%.2f, attempts=%d)" % (
+            self.success, self.elapsed, self.attempts)
+
+
+def poll(condition, timeout, expected=True, stable_for=0, interval=0.2,
+         max_interval=2, backoff=2):
+    """
+    Calls condition() until it returns the expected value, a replacement
+    for call_until_true that finishes as soon as the condition flips,
+    with sub-second first intervals that grow exponentially.
+
+    :param expected: the value to wait for; False for negative checks,
+                     e.g. waiting for a host to become unreachable
+    :param stable_for: seconds the condition has to keep the expected
+                       value, so a negative check is not fooled by a
+                       single lost packet. The interval goes back to the
+                       initial one once it flips.
+    :returns: a PollResult
+    """
+    start = time.time()
+    flipped = None
+    attempts = 0
+    delay = interval
+    while True:
+        attempts += 1
+        now = time.time()
+        if bool(condition()) == expected:
+            if flipped is None:
+                flipped = now
+                delay = interval
+            if now - flipped >= stable_for:
+                return PollResult(True, flipped - start, attempts)
+        else:
+            flipped = None
+        # a streak started before the timeout is allowed to finish
+        if flipped is None and now - start >= timeout:
+            return PollResult(False, now - start, attempts)
+        time.sleep(delay)
+        if flipped is None:
+            delay = min(delay * backoff, max_interval)
+
+
+class BatchWaiter(object):
+    """
+    Waits for many resources of the same kind with a single list call per
+    polling tick, instead of a GET per resource.
+
+    The interval grows while nothing changes and goes back to the initial
+    one as soon as a resource changes status. Every resource has its own
+    deadline, and the time spent in each status is recorded.
+    """
+
+    def __init__(self, kind, list_resources, timeout, interval=0.5,
+                 max_interval=5, backoff=1.5, error_statuses=('ERROR',)):
+        """
+        :param kind: name of the resources, for the logs and errors
+        :param list_resources: callable returning the resource dicts, with
+                               'id' and 'status' keys
+        :param timeout: default deadline of the resources, in seconds
+        """
+        self.kind = kind
+        self.list_resources = list_resources
+        self.timeout = timeout
+        self.interval = interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.error_statuses = error_statuses
+        self.pending = {}
+
+    def add(self, resource_id, status, timeout=None):
+        """
+        :param status: the status to wait for, DELETED to wait until the
+                       resource is not listed anymore
+        """
+        self.pending[resource_id] = dict(target=status,
+                                         timeout=timeout or self.timeout,
+                                         status=None,
+                                         states={},
+                                         resource=None)
+
+    def wait(self):
+        """
+        :returns: resource id -> dict with the last listed resource, the
+                  time it took to get to the target status ('elapsed'),
+                  the time of the listing it showed up in ('reached')
+                  and the seconds spent in each status ('states')
+        :raises: WaitError if a resource goes to an error status
+        :raises: TimeoutException if a resource misses its deadline
+        """
+        results = {}
+        start = last = time.time()
+        interval = self.interval
+        while self.pending:
+            listed = dict((r['id'], r) for r in self.list_resources())
+            now = time.time()
+            changed = False
+            for resource_id, wait in list(self.pending.items()):
+                resource = listed.get(resource_id)
+                status = resource['status'] if resource else DELETED
+                if wait['status'] is not None:
+                    wait['states'][wait['status']] = \
+                        wait['states'].get(wait['status'], 0) + now - last
+                if status != wait['status']:
+                    changed = True
+                    LOG.debug("%s %s: %s -> %s", self.kind, resource_id,
+                              wait['status'], status)
+                wait['status'] = status
+                wait['resource'] = resource
+                if status == wait['target']:
+                    results[resource_id] = dict(resource=resource,
+                                                elapsed=now - start,
+                                                reached=now,
+                                                states=wait['states'])
+                    del self.pending[resource_id]
+                elif status in self.error_statuses:
+                    raise WaitError(kind=self.kind, resource_id=resource_id,
+                                    status=status)
+                elif now - start > wait['timeout']:
+                    raise lib_exc.TimeoutException(
+                        "%s %s did not get to %s in %ds, last status %s"
+                        % (self.kind, resource_id, wait['target'],
+                           wait['timeout'], status))
+            last = now
+            if not self.pending:
+                break
+            interval = (self.interval if changed
+                        else min(interval * self.backoff, self.max_interval))
+            time.sleep(interval)
+        for resource_id, result in results.items():
+            LOG.info("%s %s ready after %.1fs, time in status: %s",
+                     self.kind, resource_id, result['elapsed'],
+                     dict((k, round(v, 1))
+                          for k, v in result['states'].items()))
+        return results
+
+
+def server_waiter(servers_client, timeout, interval=None, **params):
+    """
+    :param interval: fixed seconds between the list calls, instead of
+                     the growing default ones, when the time a server got
+                     to its status matters
+    :param params: filters of the list call, e.g. all_tenants=True for
+                   an admin waiting on the servers of other tenants
+    """
+    intervals = {}
+    if interval:
+        intervals = dict(interval=interval, max_interval=interval)
+    return BatchWaiter(
+        'server',
+        lambda: servers_client.list_servers_with_detail(
+            params or None)['servers'],
+        timeout, **intervals)
+
+
+def port_waiter(network_client, timeout, **filters):
+    return BatchWaiter(
+        'port',
+        lambda: network_client.list_ports(**filters)['ports'],
+        timeout)
+
+
+def lbaas_waiter(network_client, kind, timeout, **filters):
+    """
+    :param kind: pool, member or vip, the LBaaS resources with a status
+    """
+    plural = kind + 's'
+    return BatchWaiter(
+        kind,
+        lambda: getattr(network_client, 'list_' + plural)(**filters)[plural],
+        timeout)
@@ -0,0 +1,173 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Long lived access points (gateways), one per tenant.
+
+Booting an access point costs a VM, a network, a router, a security group,
+a floating ip and waiting for ssh. Instead of doing that for every
+scenario, the GatewayService boots it the first time a tenant needs it and
+then only attaches (and detaches) a port on the networks of each
+scenario. The access point lives as long as its tenant: the test class
+when the tenant is an isolated one, the whole run for the configured or
+pooled tenants.
+"""
+
+import atexit
+import threading
+
+from tempest import config
+from tempest_lib import exceptions as lib_exc
+from tempest.scenario import manager
+
+from midokura.midotools import credential_pool
+from midokura.midotools import waiters
+
+CONF = config.CONF
+LOG = manager.log.getLogger(__name__)
+
+
+class AccessPoint(object):
+
+    def __init__(self, builder, serv_dict, resources):
+        # the builder owning the access point resources and cleanups
+        self.builder = builder
+        self.serv_dict = serv_dict
+        self.resources = resources
+        # network id -> port id of the attached interfaces
+        self.ports = {}
+        self.lock = threading.Lock()
+
+    @property
+    def server_id(self):
+        return self.serv_dict['server']['id']
+
+
+class GatewayService(object):
+
+    def __init__(self):
+        self._access_points = {}
+        self._lock = threading.Lock()
+        # tenant id -> lock serializing the boot of its access point, the
+        # tenants of a scenario boot theirs concurrently
+        self._tenant_locks = {}
+        self._atexit = False
+
+    def _get_access_point(self, builder):
+        tenant_id = builder.tenant_id
+        with self._lock:
+            tenant_lock = self._tenant_locks.setdefault(tenant_id,
+                                                        threading.Lock())
+            if not self._atexit:
+                atexit.register(self.shutdown_all)
+                self._atexit = True
+        with tenant_lock:
+            access_point = self._access_points.get(tenant_id)
+            if access_point is None:
+                gw_builder = builder._clone_builder()
+                serv_dict, resources = gw_builder._set_access_point(tenant_id)
+                access_point = AccessPoint(gw_builder, serv_dict, resources)
+                # a pooled tenant is scrubbed between test classes,
+                # but its access point has to survive
+                credential_pool.preserve(tenant_id, resources)
+                with self._lock:
+                    self._access_points[tenant_id] = access_point
+        return access_point
+
+    def acquire(self, builder, networks):
+        """
+        Attaches the access point of the builder's tenant to the networks
+        (booting it if needed)
+        :returns: the access point server dict, as _create_server returns
+        """
+        access_point = self._get_access_point(builder)
+        gw_builder = access_point.builder
+        client = gw_builder.interface_client
+        with access_point.lock:
+            waiter = waiters.port_waiter(gw_builder.network_client,
+                                         CONF.network.build_timeout,
+                                         device_id=access_point.server_id)
+            for network in networks:
+                if (network['id'] in access_point.ports or
+                        network['id'] in access_point.resources):
+                    continue
+                body = client.create_interface(access_point.server_id,
+                                               network_id=network['id'])
+                port_id = body['port_id']
+                access_point.ports[network['id']] = port_id
+                waiter.add(port_id, 'ACTIVE')
+            if waiter.pending:
+                waiter.wait()
+                access_point.serv_dict['server'] = \
+                    gw_builder.servers_client.get_server(
+                        access_point.server_id)
+                self._ifup_interfaces(access_point)
+            return dict(access_point.serv_dict)
+
+    def _ifup_interfaces(self, access_point):
+        # FIXME: look as soon as we change cirros image
+        # cirros does not bring up hotplugged interfaces, and their names
+        # keep growing as they get attached and detached
+        ssh_client = access_point.builder.setup_tunnel(
+            [(access_point.serv_dict['FIP'].floating_ip_address,
+              access_point.serv_dict['keypair']['private_key'])])
+        ssh_client.exec_command(
+            "for dev in $(ls /sys/class/net | grep eth); do "
+            "grep -q up /sys/class/net/$dev/operstate || "
+            "sudo /sbin/cirros-dhcpc up $dev; done",
+            cmd_timeout=300)
+
+    def release(self, tenant_id, networks):
+        """
+        Detaches the access point from the networks, so they can be deleted
+        """
+        access_point = self._access_points.get(tenant_id)
+        if access_point is None:
+            return
+        gw_builder = access_point.builder
+        with access_point.lock:
+            waiter = waiters.port_waiter(gw_builder.network_client,
+                                         CONF.network.build_timeout,
+                                         device_id=access_point.server_id)
+            for network in networks:
+                port_id = access_point.ports.pop(network['id'], None)
+                if port_id is None:
+                    continue
+                try:
+                    gw_builder.interface_client.delete_interface(
+                        access_point.server_id, port_id)
+                except lib_exc.NotFound:
+                    continue
+                waiter.add(port_id, waiters.DELETED)
+            try:
+                waiter.wait()
+            except lib_exc.TimeoutException as e:
+                LOG.warning("Ports of the access point were not deleted: %s",
+                            e)
+
+    def shutdown(self, tenant_id):
+        """
+        Deletes the access point of the tenant, if there is one
+        """
+        with self._lock:
+            access_point = self._access_points.pop(tenant_id, None)
+        if access_point is None:
+            return
+        credential_pool.forget(tenant_id)
+        access_point.builder.doCleanups()
+
+    def shutdown_all(self):
+        for tenant_id in list(self._access_points):
+            self.shutdown(tenant_id)
+
+
+service = GatewayService()
@@ -13,10 +13,10 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import yaml
 import os
 import signal
 import subprocess
+import time
 
 from tempest import clients
 from tempest import exceptions
@@ -24,10 +24,17 @@ from tempest.common import credentials
 from tempest import config
 from tempest.scenario import manager
 from tempest.services.network import resources as net_resources
-import tempest.test
 
+from midokura.midotools import connectivity
+from midokura.midotools import credential_pool
+from midokura.midotools import parallel
 from midokura.midotools import remote_client
 from midokura.midotools import ssh
+from midokura.midotools import waiters
+from midokura.scenario import gateway
+from midokura.scenario import reachability
+from midokura.scenario import scenario_registry
+from midokura.scenario import topology_plan
 
 # Remove direct dependency on tempest, rely on the imports from scenario
 # TODO: we may need to add more in the future as thing move to tempest_lib
@@ -37,6 +44,13 @@ log = manager.log
 CONF = config.CONF
 LOG = log.getLogger(__name__)
 
+# Maximum concurrent API requests of a builder
+API_WORKERS = 10
+
+# Seconds a host has to stay unreachable for a negative connectivity
+# check to pass
+UNREACHABLE_STABLE_FOR = 5
+
 
 class AdvancedNetworkScenarioTest(manager.NetworkScenarioTest):
 
@@ -44,10 +58,18 @@ class AdvancedNetworkScenarioTest(manager.NetworkScenarioTest):
     Base class for all Midokura network scenario tests
     """
 
+    # builder attributes set by set_context and _setup_topology
+    CONTEXT_ATTRS = ['mymanager', 'floating_ips_client', 'keypairs_client',
+                     'security_groups_client', 'servers_client',
+                     'interface_client', 'network_client', 'networks_client',
+                     'tenant_id']
+
     def __init__(self, *args, **kwargs):
         if 'builder' not in kwargs:
             # We are running a test method, initialize as usual
             super(AdvancedNetworkScenarioTest, self).__init__(*args, **kwargs)
+            self._keypairs = {}
+            self._server_ports = {}
         else:
             # We are running our topology builder and this instance
             # needs some glue to store cleanup methods
@@ -56,6 +78,8 @@ class AdvancedNetworkScenarioTest(manager.NetworkScenarioTest):
             self._outcome = None
             self._testMethodName = 'builder'
             self._resultForDoCleanups = self.defaultTestResult()
+            self._keypairs = {}
+            self._server_ports = {}
 
     @classmethod
     def resource_setup(cls):
@@ -70,6 +94,9 @@ class AdvancedNetworkScenarioTest(manager.NetworkScenarioTest):
         # is defined on the inherited class
         super(AdvancedNetworkScenarioTest, cls).resource_cleanup()
         cls.builder.doCleanups()
+        if CONF.auth.allow_tenant_isolation:
+            # The tenant of the class is gone, and its access point too
+            gateway.service.shutdown(cls.tenant_id)
 
     """
     Creation Methods
@@ -83,6 +110,10 @@ class AdvancedNetworkScenarioTest(manager.NetworkScenarioTest):
         else:
             rulesets = rule_dict['security_group_rules']
         for ruleset in rulesets:
+            # the registry fills the keys a rule leaves out with None,
+            # which neutron refuses
+            ruleset = dict((key, value) for key, value in ruleset.items()
+                           if value is not None)
             for r_direction in ['ingress', 'egress']:
                 ruleset['direction'] = r_direction
                 try:
@@ -106,6 +137,39 @@ class AdvancedNetworkScenarioTest(manager.NetworkScenarioTest):
                                               port_id=port_id)
         return floating_ip
 
+    def _create_ports(self, networks, security_groups, quantity):
+        """
+        Creates the ports of `quantity` servers with one bulk request
+        :returns: a list with the ports (one per network) of each server
+        """
+        port_list = []
+        for x in range(quantity):
+            for net in networks:
+                port_list.append(dict(
+                    network_id=net['id'],
+                    tenant_id=self.tenant_id,
+                    security_groups=[sg['id'] for sg in security_groups]))
+        ports = self.network_client.create_bulk_port(port_list)['ports']
+        for port in ports:
+            # nova does not delete the ports it did not create
+            self.addCleanup(self.delete_wrapper,
+                            self.network_client.delete_port, port['id'])
+        return [ports[x * len(networks):(x + 1) * len(networks)]
+                for x in range(quantity)]
+
+    def _create_floating_ips(self, ports):
+        """
+        Creates and associates the floating ips of the ports concurrently,
+        they don't need to wait for the servers to boot
+        """
+        public_network_id = CONF.network.public_network_id
+        return parallel.run_concurrently(
+            lambda port: self.create_floating_ip(port,
+                                                 public_network_id,
+                                                 port_id=port['id']),
+            ports,
+            workers=API_WORKERS)
+
     def _create_health_monitor(self, pool_id, kwargs):
         health_monitor = self.network_client.create_health_monitor(**kwargs)
         self.addCleanup(
@@ -117,27 +181,57 @@ class AdvancedNetworkScenarioTest(manager.NetworkScenarioTest):
             self.network_client.disassociate_health_monitor_with_pool,
             health_monitor['health_monitor']['id'], pool_id)
 
+    def _get_tenant_keypair(self):
+        """
+        All the servers of a tenant share one keypair, generated locally
+        and imported once, instead of a nova generated keypair per server
+        """
+        keypair = self._keypairs.get(self.tenant_id)
+        if keypair is None:
+            private_key, public_key = ssh.generate_rsa_keypair()
+            name = data_utils.rand_name(self.__class__.__name__)
+            body = self.keypairs_client.create_keypair(name, public_key)
+            self.addCleanup(self.keypairs_client.delete_keypair, name)
+            keypair = dict(body, private_key=private_key)
+            self._keypairs[self.tenant_id] = keypair
+        return keypair
+
     def _create_server(self, name, networks,
                        security_groups=None,
-                       has_FIP=False):
-        keypair = self.create_keypair()
+                       has_FIP=False,
+                       ports=None,
+                       FIP=None,
+                       wait=True):
+        """
+        :param ports: pre-created ports (one per network) to boot the
+        server with, the security groups are the ones of the ports
+        :param FIP: floating ip already associated to the first port
+        :param wait: wait for the server to be active, and for its
+        deletion on cleanup. Without it the caller waits for both (see
+        _wait_for_servers) and has to pass the FIP if it wants one.
+        """
+        keypair = self._get_tenant_keypair()
         if security_groups is None:
             raise Exception("No security group")
 
-        nics = list()
-        for net in networks:
-            nic = {'uuid': net['id']}
-            nics.append(nic)
+        if ports:
+            nics = [{'port': port['id']} for port in ports]
+        else:
+            nics = [{'uuid': net['id']} for net in networks]
         create_kwargs = {
             'networks': nics,
             'key_name': keypair['name'],
-            'security_groups': security_groups,
             'tenant_id': self.tenant_id,
         }
+        if not ports:
+            create_kwargs['security_groups'] = security_groups
         server = self.create_server(name=name,
+                                    wait_on_boot=wait,
+                                    wait_on_delete=wait,
                                     create_kwargs=create_kwargs)
-        FIP = None
-        if has_FIP:
+        if ports:
+            self._server_ports[server['id']] = ports
+        if has_FIP and FIP is None:
             # FIXME: when cirros is gone
             # We bind the fip to the first network, which is the first
             # nic on cirros image (the one attached to the "gateway network")
@@ -188,30 +282,24 @@ class AdvancedNetworkScenarioTest(manager.NetworkScenarioTest):
         creates a server in a secgroup with rule allowing external ssh
         in order to access tenant internal network
         workaround ip namespace
+        The server is only connected to its own network, the gateway
+        service attaches it to the networks of each scenario
+        :returns: the server dict and the ids of the resources created
         """
-        networks = self._get_tenant_networks(tenant)
-        network, _, _ = self.create_networks(tenant_id=tenant)
-        # FIXME: look as soon as we change cirros image
-        # cirros only ifup the first interface, thus we need to put
-        # the "gateway" network at the front (so it's the first to ifup)
-        networks.insert(0, network)
+        network, subnet, router = self.create_networks(tenant_id=tenant)
 
         name = 'access_point'
         name = data_utils.rand_name(name)
 
-        self._create_security_group(tenant_id=tenant,
-                                    namestart='gateway')
-        security_groups = self._get_tenant_security_groups(tenant)
+        secgroup = self._create_security_group(tenant_id=tenant,
+                                               namestart='gateway')
         serv_dict = self._create_server(name=name,
-                                        networks=networks,
-                                        security_groups=security_groups,
+                                        networks=[network],
+                                        security_groups=[secgroup],
                                         has_FIP=True)
-
-        tupla = (serv_dict['FIP'], serv_dict['server'])
-        # FIXME: look as soon as we change cirros image
-        self._fix_access_point(tupla,
-                               serv_dict['keypair'])
-        return serv_dict
+        resources = set([network.id, subnet.id, router.id, secgroup.id,
+                         serv_dict['server']['id'], serv_dict['FIP'].id])
+        return serv_dict, resources
 
     def _fix_access_point(self, access_point, keypair):
         """
@@ -242,8 +330,17 @@ class AdvancedNetworkScenarioTest(manager.NetworkScenarioTest):
                     LOG.warning("Silent TimeoutException!")
                     LOG.warning(inst)
 
-    def build_gateway(self, tenant_id):
-        return self._set_access_point(tenant_id)
+    def build_gateway(self, tenant_id, networks):
+        """
+        Attaches the tenant's long lived access point to the networks of
+        the scenario, they are detached on cleanup (before the networks
+        are deleted). The other networks of the tenant, e.g. the ones of
+        other workers sharing a configured or pooled tenant, are left
+        alone.
+        """
+        access_point = gateway.service.acquire(self, networks)
+        self.addCleanup(gateway.service.release, tenant_id, networks)
+        return access_point
 
     def setup_tunnel(self, tunnel_hops, keep_connection=True):
         """
@@ -280,10 +377,19 @@ class AdvancedNetworkScenarioTest(manager.NetworkScenarioTest):
     """
 
     def _get_tenant(self, tenant):
+        pool = credential_pool.get_pool()
+        if pool:
+            # Reuse a pre-provisioned tenant, it's scrubbed on release
+            lease = pool.lease()
+            self.addCleanup(lease.release)
+            return lease.credentials
         iso_creds = credentials.get_isolated_credentials(tenant)
         self.addCleanup(iso_creds.clear_isolated_creds)
         # Get admin credentials to be able to create resources
         tenant_admin_creds = iso_creds.get_credentials('admin')
+        # The access point can't outlive the tenant
+        self.addCleanup(gateway.service.shutdown,
+                        tenant_admin_creds.tenant_id)
         return tenant_admin_creds
 
     def _get_tenant_security_groups(self, tenant=None):
@@ -307,8 +413,28 @@ class AdvancedNetworkScenarioTest(manager.NetworkScenarioTest):
         routers = client.list_routers(tenant_id=tenant)
         return routers['routers']
 
+    def _wait_for_servers(self, server_ids, status='ACTIVE', client=None,
+                          **params):
+        """
+        Waits for all the servers at once, with one list call per
+        polling tick instead of a get per server
+        :param status: the status to wait for, waiters.DELETED to wait
+        for the deletion of the servers
+        :returns: server id -> server details in the status
+        """
+        waiter = waiters.server_waiter(client or self.servers_client,
+                                       CONF.compute.build_timeout,
+                                       **params)
+        for server_id in server_ids:
+            waiter.add(server_id, status)
+        return dict((server_id, result['resource'])
+                    for server_id, result in waiter.wait().items())
+
     def _get_custom_server_port_id(self, server, ip_addr=None):
-        ports = self._list_ports(device_id=server['id'])
+        # the ports created by the builder are already known
+        ports = self._server_ports.get(server['id'])
+        if not ports:
+            ports = self._list_ports(device_id=server['id'])
         if ip_addr:
             for port in ports:
                 if port['fixed_ips'][0]['ip_address'] == ip_addr:
@@ -347,6 +473,19 @@ class AdvancedNetworkScenarioTest(manager.NetworkScenarioTest):
     Tool methods
     """
 
+    def _clone_builder(self):
+        """
+        :returns: a new builder working on the same tenant and clients,
+        with cleanups of its own
+        """
+        builder = self.__class__(builder=True)
+        for attr in self.CONTEXT_ATTRS:
+            if attr in self.__dict__:
+                setattr(builder, attr, self.__dict__[attr])
+        # and the same tenant keypair
+        builder._keypairs = self._keypairs
+        return builder
+
     def set_context(self, credentials):
         # TODO: we may need to get other clients to avoid auth problems
         self.mymanager = clients.Manager(credentials=credentials)
@@ -387,11 +526,192 @@ class AdvancedNetworkScenarioTest(manager.NetworkScenarioTest):
             LOG.info(inst.args)
             raise
 
-    def _locate_file(self, path):
-        realpath = os.getcwd()
-        for root, dirs, _ in os.walk(realpath):
-            if path in dirs:
-                return os.path.join(root, path)
+    def _fixed_addresses(self, server):
+        """
+        :returns: (network name, address) of the fixed ipv4 addresses
+        """
+        return [(network, address['addr'])
+                for network, addresses in sorted(server['addresses'].items())
+                for address in addresses
+                if address['version'] == 4 and
+                address.get('OS-EXT-IPS:type', 'fixed') == 'fixed']
+
+    def _get_source_client(self, server_def, access_point=None):
+        """
+        ssh client of a server, through the access point if there is one,
+        through its floating ip otherwise
+        """
+        key = server_def['keypair']['private_key']
+        if access_point is None:
+            hops = [(server_def['FIP'].floating_ip_address, key)]
+        else:
+            ap_networks = access_point['server']['addresses'].keys()
+            address = [addr for network, addr
+                       in self._fixed_addresses(server_def['server'])
+                       if network in ap_networks][0]
+            hops = [(access_point['FIP'].floating_ip_address,
+                     access_point['keypair']['private_key']),
+                    (address, key)]
+        return self.setup_tunnel(hops)
+
+    def check_connectivity_matrix(self, servers_and_keys, access_point=None,
+                                  protocols=('icmp',),
+                                  port=connectivity.PROBE_PORT,
+                                  floating_ips=False, retry_for=0):
+        """
+        Probes every fixed address of every server from all the other
+        servers. Each source runs one remote command probing all its
+        targets, and all the sources run at the same time.
+        :param servers_and_keys: the server dicts, as setup_topology
+        returns them (without the access point)
+        :param access_point: the access point server dict to reach the
+        servers through, they are reached by their FIP otherwise
+        :param protocols: any of 'icmp', 'tcp' and 'udp'. The tcp and udp
+        probes go to responders started on `port` of every server.
+        :param floating_ips: probe the floating ips of the servers too
+        :param retry_for: seconds the failed probes are retried for, for
+        checks that expect every pair to be reachable
+        :returns: a connectivity.ConnectivityMatrix with every pair, the
+        ones without a probe result (e.g. a truncated output) are
+        unreachable
+        """
+        matrix = connectivity.ConnectivityMatrix()
+        targets = {}
+        for server_def in servers_and_keys:
+            server = server_def['server']
+            targets[server['name']] = [
+                address for _, address in self._fixed_addresses(server)]
+            if floating_ips and server_def.get('FIP'):
+                targets[server['name']].append(
+                    server_def['FIP'].floating_ip_address)
+            for address in targets[server['name']]:
+                matrix.names[address] = server['name']
+
+        clients = parallel.run_concurrently(
+            lambda server_def: self._get_source_client(server_def,
+                                                       access_point),
+            servers_and_keys)
+        responders = set(protocols) & set(['tcp', 'udp'])
+        if responders:
+            parallel.run_concurrently(
+                lambda client: client.exec_command(
+                    connectivity.responders_command(port)),
+                clients)
+
+        def probe(source):
+            name, client, addresses = source
+            output = client.exec_command(
+                connectivity.probe_command(addresses, protocols, port),
+                cmd_timeout=60)
+            return name, connectivity.parse_probe_output(output)
+
+        sources = []
+        expected = []
+        for server_def, client in zip(servers_and_keys, clients):
+            name = server_def['server']['name']
+            addresses = [address for target, target_addresses
+                         in sorted(targets.items()) if target != name
+                         for address in target_addresses]
+            sources.append((name, client, addresses))
+            expected.extend((name, address, protocol,
+                             None if protocol == 'icmp' else port)
+                            for address in addresses
+                            for protocol in protocols)
+
+        start = time.time()
+        try:
+            while sources:
+                for name, probes in parallel.run_concurrently(probe,
+                                                              sources):
+                    for (protocol, address, probe_port, reachable,
+                         rtt) in probes:
+                        matrix.add(name, address, protocol, probe_port,
+                                   reachable, rtt)
+                failed = set(key[:2] for key in expected
+                             if not matrix.results.get(
+                                 key, {}).get('reachable'))
+                if time.time() - start >= retry_for:
+                    break
+                sources = [(name, client,
+                            [address for address in addresses
+                             if (name, address) in failed])
+                           for name, client, addresses in sources]
+                sources = [source for source in sources if source[2]]
+                if sources:
+                    time.sleep(1)
+        finally:
+            if responders:
+                parallel.run_concurrently(
+                    lambda client: client.exec_command(
+                        connectivity.STOP_RESPONDERS),
+                    clients)
+        for key in expected:
+            if key not in matrix.results:
+                LOG.warning("No probe result for %s, counted as "
+                            "unreachable", key)
+                matrix.add(*key, reachable=False)
+        LOG.info("Connectivity matrix:\n%s", matrix.format())
+        return matrix
+
+    def _select_paths(self, servers_and_keys):
+        """
+        Picks a pair of servers for each kind of path they allow:
+        'l2' (same network), 'routed' (different networks), 'fip' (to
+        the floating ip of the target) and 'cross_host' (same network,
+        different compute hosts, when there is more than one)
+        :returns: path kind -> (source dict, target dict, target address)
+        """
+        def networks(server_def):
+            return dict(self._fixed_addresses(server_def['server']))
+
+        hosts = {}
+        if len(self._get_compute_hostnames()) > 1:
+            for server_def in servers_and_keys:
+                server_id = server_def['server']['id']
+                hosts[server_id] = self._get_host_for_server(server_id)
+        paths = {}
+        for source in servers_and_keys:
+            for target in servers_and_keys:
+                if source is target:
+                    continue
+                shared = set(networks(source)) & set(networks(target))
+                if shared:
+                    address = networks(target)[sorted(shared)[0]]
+                    kind = 'l2'
+                    if hosts and (hosts[source['server']['id']] !=
+                                  hosts[target['server']['id']]):
+                        kind = 'cross_host'
+                    paths.setdefault(kind, (source, target, address))
+                else:
+                    paths.setdefault('routed',
+                                     (source, target,
+                                      sorted(networks(target).items())[0][1]))
+                if target.get('FIP'):
+                    paths.setdefault(
+                        'fip', (source, target,
+                                target['FIP'].floating_ip_address))
+        return paths
+
+    def expected_connectivity(self, yaml_topology, scenario, **kwargs):
+        """
+        The connectivity matrix the scenario should measure, computed
+        from its definition (see reachability.expected_matrix)
+        :param scenario: what setup_topology returned for yaml_topology
+        """
+        return reachability.expected_matrix(
+            self._load_topology(yaml_topology), scenario, **kwargs)
+
+    def assert_connectivity(self, expected, measured):
+        """
+        Fails listing every probe whose measured reachability is not the
+        expected one
+        """
+        differences = expected.diff(measured)
+        self.assertEqual([], differences,
+                         "Unexpected connectivity:\n%s" % "\n".join(
+                             "%s -> %s %s %s: expected %s, measured %s"
+                             % (key + (exp, got))
+                             for key, exp, got in differences))
 
     def kill_me(self, name):
         p = subprocess.Popen(['ps', '-A'], stdout=subprocess.PIPE)
@@ -429,12 +749,45 @@ class AdvancedNetworkScenarioTest(manager.NetworkScenarioTest):
             except ssh.SSHExecCommandFailed:
                 LOG.warn('Failed to ping IP: %s via a ssh connection from: %s.'
                          % (dest, source.ssh_client.host))
-                return not should_succeed
-            return should_succeed
-
-        return tempest.test.call_until_true(ping_remote,
-                                            CONF.compute.ping_timeout,
-                                            1)
+                return False
+            return True
+
+        return self._poll_reachability(ping_remote, dest, should_succeed,
+                                       CONF.compute.ping_timeout,
+                                       source.ssh_client.host)
+
+    def ping_ip_address(self, ip_address, should_succeed=True,
+                        ping_timeout=None):
+        # Same as the parent method, polling adaptively
+        cmd = ['ping', '-c1', '-w1', ip_address]
+
+        def ping():
+            proc = subprocess.Popen(cmd,
+                                    stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE)
+            proc.communicate()
+            return proc.returncode == 0
+
+        return self._poll_reachability(
+            ping, ip_address, should_succeed,
+            ping_timeout or CONF.compute.ping_timeout)
+
+    def _poll_reachability(self, reachable, dest, should_succeed, timeout,
+                           source='localhost'):
+        """
+        Returns as soon as reachable() agrees with should_succeed, a
+        negative check has to stay unreachable for UNREACHABLE_STABLE_FOR
+        seconds
+        """
+        result = waiters.poll(
+            reachable, timeout,
+            expected=should_succeed,
+            stable_for=0 if should_succeed else UNREACHABLE_STABLE_FOR)
+        LOG.info("%s %s from %s: %s after %.1fs (%d attempts)",
+                 dest, 'reachable' if should_succeed else 'unreachable',
+                 source, 'converged' if result else 'timed out',
+                 result.elapsed, result.attempts)
+        return bool(result)
 
     """
     YAML parsing methods
@@ -445,21 +798,22 @@ class AdvancedNetworkScenarioTest(manager.NetworkScenarioTest):
             self.tenant_id = tenant_id
 
         routers = {}
-        if 'routers' in topology:
-            for router_def in topology['routers']:
-                if router_def['public']:
-                    router = self._get_router(client=self.network_client,
-                                              tenant_id=self.tenant_id)
-                else:
-                    router = self._create_router(namestart=router_def['name'],
-                                                 tenant_id=self.tenant_id)
-                routers[router_def['name']] = router.id
+        for router_def in topology['routers']:
+            if router_def['public']:
+                router = self._get_router(client=self.network_client,
+                                          tenant_id=self.tenant_id)
+            else:
+                router = self._create_router(namestart=router_def['name'],
+                                             tenant_id=self.tenant_id)
+            routers[router_def['name']] = router.id
 
         networks = [n for n in topology['networks']]
+        scenario_networks = []
         for network in networks:
             net = self._create_network(client=self.network_client,
                                        tenant_id=self.tenant_id,
                                        namestart=network['name'])
+            scenario_networks.append(net)
             for subnet_def in network['subnets']:
                 subnet_dic = \
                     dict(
@@ -489,6 +843,10 @@ class AdvancedNetworkScenarioTest(manager.NetworkScenarioTest):
                     rule_dict=secgroup,
                     secgroup=sg)
         test_topology = []
+        server_ids = []
+        # Registered before the servers are created, so it runs once all
+        # of them have been deleted
+        self.addCleanup(self._wait_for_servers, server_ids, waiters.DELETED)
         for server in topology['servers']:
             s_nets = []
             for snet in server['networks']:
@@ -496,48 +854,83 @@ class AdvancedNetworkScenarioTest(manager.NetworkScenarioTest):
             s_sg = []
             for sg in server['security_groups']:
                 s_sg.append(self._get_security_group_by_name(sg['name']))
+            ports = self._create_ports(s_nets, s_sg, server['quantity'])
+            FIPs = [None] * server['quantity']
+            if server['floating_ip']:
+                # FIXME: when cirros is gone
+                # the fip goes to the first nic, see _create_server
+                FIPs = self._create_floating_ips(
+                    [s_ports[0] for s_ports in ports])
             for x in range(server['quantity']):
-                if 'name' in server:
-                    name = server['name']
-                else:
-                    name = 'server-smoke'
-                name = data_utils.rand_name(name)
+                name = data_utils.rand_name(server['name'])
                 s_server = self._create_server(name=name,
                                                networks=s_nets,
                                                security_groups=s_sg,
-                                               has_FIP=server['floating_ip'])
-                # FIXME: fix for cirros, does not bring up more than one
-                # interface
-                if len(s_nets) > 1:
-                    tupla = (s_server['FIP'], s_server['server'])
-                    self._fix_access_point(tupla,
-                                           s_server['keypair'])
-
+                                               has_FIP=server['floating_ip'],
+                                               ports=ports[x],
+                                               FIP=FIPs[x],
+                                               wait=False)
+                server_ids.append(s_server['server']['id'])
                 test_topology.append(s_server)
 
+        # All the servers boot at the same time
+        servers = self._wait_for_servers(server_ids)
+        for s_server in test_topology:
+            s_server['server'] = servers[s_server['server']['id']]
+            # FIXME: fix for cirros, does not bring up more than one
+            # interface
+            if len(s_server['server']['addresses']) > 1:
+                tupla = (s_server['FIP'], s_server['server'])
+                self._fix_access_point(tupla,
+                                       s_server['keypair'])
+
         if 'gateway' in topology.keys() and topology['gateway']:
-            test_topology.append(self.build_gateway(self.tenant_id))
+            test_topology.append(self.build_gateway(self.tenant_id,
+                                                    scenario_networks))
 
         return test_topology
 
+    def _load_topology(self, yaml_topology):
+        """
+        :param yaml_topology: a scenario file name or an already built
+        scenario (e.g. from topology_generator.generate)
+        """
+        if isinstance(yaml_topology, dict):
+            return scenario_registry.compile_topology(yaml_topology)
+        return scenario_registry.registry.load(yaml_topology)
+
+    def plan_topology(self, yaml_topology):
+        """
+        Dry-run of setup_topology: returns the TopologyPlan with the
+        ordered API calls it would issue, without calling any API
+        """
+        return topology_plan.build_plan(self._load_topology(yaml_topology))
+
+    def _setup_tenant_topology(self, tenant, topology):
+        """
+        Builds the scenario of a tenant from a builder of its own, so
+        several tenants can be set up at the same time without sharing
+        the client attributes of this builder
+        """
+        builder = self.__class__(builder=True)
+        self.addCleanup(builder.doCleanups)
+        tenant_creds = builder._get_tenant(tenant['name'])
+        builder.set_context(tenant_creds)
+        topo = [x for x in topology['scenarios']
+                if x['name'] == tenant['scenario']][0]
+        servers_and_keys = builder._setup_topology(
+            topo,
+            tenant_id=getattr(tenant_creds, 'tenant_id'))
+        return dict(credentials=tenant_creds,
+                    servers_and_keys=servers_and_keys)
+
     def setup_topology(self, yaml_topology):
-        mpath = self._locate_file(yaml_topology.split('/')[-2])
-        fullpath = os.path.join(mpath, yaml_topology.split('/')[-1])
-        with open(fullpath, 'r') as yaml_topology:
-            topology = yaml.load(yaml_topology)
-            scenario = list()
-            if 'tenants' in topology.keys():
-                for tenant in topology['tenants']:
-                    tenant_creds = self._get_tenant(tenant['name'])
-                    self.set_context(tenant_creds)
-                    topo = [x for x in topology['scenarios']
-                            if x['name'] == tenant['scenario']][0]
-                    scenario.append(dict(credentials=tenant_creds,
-                                         servers_and_keys=self._setup_topology(
-                                             topo,
-                                             tenant_id=getattr(tenant_creds,
-                                                               'tenant_id'))))
-            else:
-                scenario = self._setup_topology(topology)
+        topology = self._load_topology(yaml_topology)
+        if 'tenants' in topology.keys():
+            scenario = parallel.run_concurrently(
+                lambda tenant: self._setup_tenant_topology(tenant, topology),
+                topology['tenants'])
+        else:
+            scenario = self._setup_topology(topology)
 
         return scenario
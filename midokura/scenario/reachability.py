@@ -0,0 +1,235 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Expected reachability of a scenario.
+
+Computes, from the scenario definition and the servers setup_topology
+built for it, what a connectivity matrix (see
+AdvancedNetworkScenarioTest.check_connectivity_matrix) should measure:
+
+- a fixed address is reached from the same subnet, or through the
+  default routers (the first router of each subnet) when the router of
+  the source's first nic is attached to the target's subnet and the
+  router of the target's subnet to the source's. Host routes are not
+  taken into account.
+- fixed addresses of other tenants are unreachable, or unknown (None)
+  when they overlap with a subnet of the source's tenant.
+- a floating ip is reached when the default routers of both ends are
+  public, the source shows up as its router's address.
+- the security groups of the target have to allow the protocol and port
+  from the source address, every rule of the scenario allows both
+  directions (as the builder creates them) and egress is open. The
+  default group only admits its own members. Targets without security
+  groups, and rules with a remote group, give unknown (None) results.
+"""
+
+import socket
+import struct
+
+from midokura.midotools import connectivity
+
+PROTOCOL_NUMBERS = {'1': 'icmp', '6': 'tcp', '17': 'udp'}
+
+
+def _to_int(address):
+    return struct.unpack('!I', socket.inet_aton(address))[0]
+
+
+def _in_cidr(address, cidr):
+    network, prefix = cidr.split('/')
+    mask = (0xffffffff << (32 - int(prefix))) & 0xffffffff
+    return _to_int(address) & mask == _to_int(network) & mask
+
+
+class Endpoint(object):
+    """
+    A server of the scenario bound to its definition
+    """
+
+    def __init__(self, tenant, topology, definition, server_def):
+        self.tenant = tenant
+        self.topology = topology
+        self.name = server_def['server']['name']
+        fip = server_def.get('FIP')
+        self.floating_ip = fip.floating_ip_address if fip else None
+        fixed = [address['addr']
+                 for addresses in server_def['server']['addresses'].values()
+                 for address in addresses
+                 if address['version'] == 4 and
+                 address.get('OS-EXT-IPS:type', 'fixed') == 'fixed']
+        networks = dict((n['name'], n) for n in topology['networks'])
+        # (subnet, address) per nic, in the order of the definition
+        self.nics = []
+        for net_ref in definition['networks']:
+            for subnet in networks[net_ref['name']]['subnets']:
+                matches = [a for a in fixed if _in_cidr(a, subnet['cidr'])]
+                if matches:
+                    self.nics.append((subnet, matches[0]))
+                    break
+        groups = dict((sg['name'], sg)
+                      for sg in topology['security_groups'])
+        self.security_groups = [
+            # the builder reuses the existing default group as it is
+            None if sg['name'] == 'default' else groups[sg['name']]
+            for sg in definition['security_groups']]
+
+    def default_router(self):
+        if not self.nics or not self.nics[0][0]['routers']:
+            return None
+        return self.nics[0][0]['routers'][0]
+
+    def is_public(self):
+        router = self.default_router()
+        return router is not None and any(
+            r['public'] for r in self.topology['routers']
+            if r['name'] == router)
+
+    def in_default_group(self):
+        return None in self.security_groups
+
+
+def endpoints(topology, scenario):
+    """
+    :param scenario: what setup_topology returned for the topology
+    :returns: the Endpoint of every server (the access point left out)
+    """
+    if 'tenants' in topology:
+        tenants = [(tenant['name'],
+                    [x for x in topology['scenarios']
+                     if x['name'] == tenant['scenario']][0],
+                    result['servers_and_keys'])
+                   for tenant, result in zip(topology['tenants'], scenario)]
+    else:
+        tenants = [(None, topology, scenario)]
+    result = []
+    for tenant, topo, servers_and_keys in tenants:
+        definitions = [definition for definition in topo['servers']
+                       for _ in range(definition['quantity'])]
+        # setup_topology returns the servers in the order of the
+        # definition, and the access point last
+        for definition, server_def in zip(definitions, servers_and_keys):
+            result.append(Endpoint(tenant, topo, definition, server_def))
+    return result
+
+
+def _fixed_path(source, target, subnet, address):
+    """
+    :returns: the address the target sees the traffic from, False if
+              there is no path, None if it can't be told
+    """
+    if source.tenant != target.tenant:
+        # the address may exist in the source's tenant too
+        for network in source.topology['networks']:
+            for src_subnet in network['subnets']:
+                if _in_cidr(address, src_subnet['cidr']):
+                    return None
+        return False
+    for src_subnet, src_address in source.nics:
+        if src_subnet is subnet:
+            return src_address
+    if not source.nics or not subnet['routers']:
+        return False
+    src_subnet, src_address = source.nics[0]
+    if (source.default_router() in subnet['routers'] and
+            subnet['routers'][0] in src_subnet['routers']):
+        return src_address
+    return False
+
+
+def _rule_allows(rule, protocol, port, source_address):
+    if rule['remote_group_id']:
+        return None
+    if rule['ethertype'] == 'IPv6':
+        return False
+    rule_protocol = PROTOCOL_NUMBERS.get(rule['protocol'], rule['protocol'])
+    if rule_protocol not in (None, protocol):
+        return False
+    if protocol != 'icmp':
+        if rule['port_range_min'] is not None and \
+                port < rule['port_range_min']:
+            return False
+        if rule['port_range_max'] is not None and \
+                port > rule['port_range_max']:
+            return False
+    prefix = rule['remote_ip_prefix']
+    if prefix and prefix != '0.0.0.0/0':
+        if source_address is None:
+            # behind the source's router, its address is not known
+            return None
+        return _in_cidr(source_address, prefix)
+    return True
+
+
+def _allowed(source, target, protocol, port, source_address):
+    if not target.security_groups:
+        return None
+    results = []
+    for secgroup in target.security_groups:
+        if secgroup is None:
+            results.append(source_address is not None and
+                           source.tenant == target.tenant and
+                           source.in_default_group())
+            continue
+        results.extend(_rule_allows(rule, protocol, port, source_address)
+                       for rule in secgroup['security_group_rules'])
+    if True in results:
+        return True
+    if None in results:
+        return None
+    return False
+
+
+def _expect(source, target, protocol, port, subnet=None, address=None):
+    if subnet is None:
+        # floating ip
+        if not (source.is_public() and target.is_public()):
+            return False
+        return _allowed(source, target, protocol, port, None)
+    path = _fixed_path(source, target, subnet, address)
+    if not path:
+        return path
+    return _allowed(source, target, protocol, port, path)
+
+
+def expected_matrix(topology, scenario, protocols=('icmp',),
+                    port=connectivity.PROBE_PORT, floating_ips=False):
+    """
+    :param topology: the compiled scenario (see scenario_registry)
+    :param scenario: what setup_topology returned for it
+    :param floating_ips: include the floating ips of the targets
+    :returns: a connectivity.ConnectivityMatrix with the expected
+              reachability (True, False or None when unknown), to diff
+              against a measured one
+    """
+    matrix = connectivity.ConnectivityMatrix()
+    servers = endpoints(topology, scenario)
+    for target in servers:
+        for _, address in target.nics:
+            matrix.names[address] = target.name
+        if floating_ips and target.floating_ip:
+            matrix.names[target.floating_ip] = target.name
+    for source in servers:
+        for target in servers:
+            if target is source:
+                continue
+            addresses = [(address, subnet) for subnet, address
+                         in target.nics]
+            if floating_ips and target.floating_ip:
+                addresses.append((target.floating_ip, None))
+            for address, subnet in addresses:
+                for protocol in protocols:
+                    matrix.add(source.name, address, protocol,
+                               None if protocol == 'icmp' else port,
+                               _expect(source, target, protocol, port,
+                                       subnet, address))
+    return matrix
@@ -0,0 +1,294 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Registry of the scenario YAML topologies.
+
+The network_scenarios/ directory is indexed once per process, files are
+parsed with the libyaml loader when available, validated against the
+scenario schema (filling the defaults of the optional keys) and the result
+is cached until the file changes on disk.
+"""
+
+import copy
+import os
+import socket
+import threading
+
+import six
+import yaml
+
+
+SCENARIO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'network_scenarios')
+
+Loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+class ScenarioError(Exception):
+    pass
+
+
+"""
+Schema definition
+"""
+
+# Every field is (type, default). A REQUIRED default means that the key
+# must be present, a list or dict type is a nested schema.
+REQUIRED = object()
+
+RULE = {
+    'direction': (six.string_types, None),
+    'ethertype': (six.string_types, None),
+    'protocol': (six.string_types, None),
+    'port_range_min': (int, None),
+    'port_range_max': (int, None),
+    'remote_ip_prefix': (six.string_types, None),
+    'remote_group_id': (six.string_types, None),
+}
+
+SECURITY_GROUP = {
+    'name': (six.string_types, REQUIRED),
+    'description': (six.string_types, None),
+    'security_group_rules': ([RULE], []),
+}
+
+ROUTER = {
+    'name': (six.string_types, REQUIRED),
+    'public': (bool, False),
+}
+
+HOST_ROUTE = {
+    'destination': (six.string_types, REQUIRED),
+    'nexthop': (six.string_types, REQUIRED),
+}
+
+SUBNET = {
+    'name': (six.string_types, REQUIRED),
+    'cidr': (six.string_types, REQUIRED),
+    'ip_version': (int, 4),
+    'enable_dhcp': (bool, None),
+    'host_routes': ([HOST_ROUTE], []),
+    'dns_nameservers': ([six.string_types], []),
+    'allocation_pools': (list, None),
+    'routers': ([six.string_types], []),
+}
+
+NETWORK = {
+    'name': (six.string_types, REQUIRED),
+    'router:external': (bool, None),
+    'shared': (bool, None),
+    'subnets': ([SUBNET], []),
+}
+
+NAME_REF = {
+    'name': (six.string_types, REQUIRED),
+}
+
+SERVER = {
+    'name': (six.string_types, 'server-smoke'),
+    'image': (six.string_types, None),
+    'flavor': (six.string_types, None),
+    'keypair': (six.string_types, None),
+    'networks': ([NAME_REF], REQUIRED),
+    'security_groups': ([NAME_REF], []),
+    'floating_ip': (bool, False),
+    'quantity': (int, 1),
+}
+
+TOPOLOGY = {
+    'name': (six.string_types, None),
+    'servers': ([SERVER], []),
+    'networks': ([NETWORK], []),
+    'routers': ([ROUTER], []),
+    'security_groups': ([SECURITY_GROUP], []),
+    'gateway': (bool, False),
+}
+
+TENANT = {
+    'name': (six.string_types, REQUIRED),
+    'description': (six.string_types, None),
+    'scenario': (six.string_types, REQUIRED),
+}
+
+MULTITENANT = {
+    'tenants': ([TENANT], REQUIRED),
+    'scenarios': ([TOPOLOGY], REQUIRED),
+}
+
+
+def _compile(schema):
+    """
+    Turns a schema definition into a function that validates a parsed
+    value and returns it with the defaults filled in
+    """
+    if isinstance(schema, dict):
+        fields = [(key, _compile(kind), default)
+                  for key, (kind, default) in schema.items()]
+
+        def check_dict(value, where):
+            if not isinstance(value, dict):
+                raise ScenarioError("%s: expected a mapping, got %r"
+                                    % (where, value))
+            unknown = set(value) - set(schema)
+            if unknown:
+                raise ScenarioError("%s: unknown keys %s"
+                                    % (where, sorted(unknown)))
+            result = {}
+            for key, check, default in fields:
+                if value.get(key) is None:
+                    if default is REQUIRED:
+                        raise ScenarioError("%s: missing '%s'"
+                                            % (where, key))
+                    result[key] = copy.deepcopy(default)
+                else:
+                    result[key] = check(value[key], "%s.%s" % (where, key))
+            return result
+        return check_dict
+
+    if isinstance(schema, list):
+        check_item = _compile(schema[0])
+
+        def check_list(value, where):
+            if not isinstance(value, list):
+                raise ScenarioError("%s: expected a list, got %r"
+                                    % (where, value))
+            return [check_item(item, "%s[%d]" % (where, i))
+                    for i, item in enumerate(value)]
+        return check_list
+
+    def check_type(value, where):
+        # bool is an int subclass, do not accept True as a quantity
+        if (not isinstance(value, schema) or
+                (isinstance(value, bool) and schema is int)):
+            raise ScenarioError("%s: unexpected value %r" % (where, value))
+        return value
+    return check_type
+
+
+_check_topology = _compile(TOPOLOGY)
+_check_multitenant = _compile(MULTITENANT)
+
+
+def _check_cidr(cidr, where):
+    try:
+        address, prefix = cidr.split('/')
+        socket.inet_aton(address)
+        if not 0 <= int(prefix) <= 32:
+            raise ValueError(prefix)
+    except (ValueError, socket.error):
+        raise ScenarioError("%s: invalid cidr %r" % (where, cidr))
+
+
+def _check_references(topology, where):
+    routers = set(r['name'] for r in topology['routers'])
+    networks = set(n['name'] for n in topology['networks'])
+    secgroups = set(sg['name'] for sg in topology['security_groups'])
+    secgroups.add('default')
+    for network in topology['networks']:
+        for subnet in network['subnets']:
+            _check_cidr(subnet['cidr'], "%s.subnet %s"
+                        % (where, subnet['name']))
+            for router in set(subnet['routers']) - routers:
+                raise ScenarioError("%s: subnet %s uses unknown router %s"
+                                    % (where, subnet['name'], router))
+    for server in topology['servers']:
+        for net in server['networks']:
+            if net['name'] not in networks:
+                raise ScenarioError("%s: server %s uses unknown network %s"
+                                    % (where, server['name'], net['name']))
+        for sg in server['security_groups']:
+            if sg['name'] not in secgroups:
+                raise ScenarioError("%s: server %s uses unknown security "
+                                    "group %s"
+                                    % (where, server['name'], sg['name']))
+
+
+def compile_topology(topology, where='topology'):
+    """
+    Validates a parsed scenario and fills the defaults of the optional
+    keys, so the builder can index every key without checking it first
+    """
+    if topology is None:
+        raise ScenarioError("%s: empty scenario" % where)
+    if 'tenants' in topology:
+        compiled = _check_multitenant(topology, where)
+        scenarios = set()
+        for i, scenario in enumerate(compiled['scenarios']):
+            _check_references(scenario, "%s.scenarios[%d]" % (where, i))
+            scenarios.add(scenario['name'])
+        for tenant in compiled['tenants']:
+            if tenant['scenario'] not in scenarios:
+                raise ScenarioError("%s: tenant %s uses unknown scenario %s"
+                                    % (where, tenant['name'],
+                                       tenant['scenario']))
+    else:
+        compiled = _check_topology(topology, where)
+        _check_references(compiled, where)
+    return compiled
+
+
+class ScenarioRegistry(object):
+    """
+    Indexes the scenario files by name and caches the compiled topologies
+    """
+
+    def __init__(self, directory=SCENARIO_DIR):
+        self.directory = directory
+        self._index = None
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    @property
+    def index(self):
+        if self._index is None:
+            index = {}
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    if name.endswith('.yaml'):
+                        index.setdefault(name, os.path.join(root, name))
+            self._index = index
+        return self._index
+
+    def locate(self, yaml_topology):
+        """
+        :param yaml_topology: a file name (or a path ending with it, as
+        the tests pass '/network_scenarios/scenario_foo.yaml')
+        :returns: the full path of the scenario file
+        """
+        path = self.index.get(os.path.basename(yaml_topology))
+        if path:
+            return path
+        if os.path.isfile(yaml_topology):
+            return yaml_topology
+        raise ScenarioError("Scenario %s not found in %s"
+                            % (yaml_topology, self.directory))
+
+    def load(self, yaml_topology):
+        """
+        :returns: a private copy of the compiled topology, the builder is
+        free to modify it
+        """
+        path = self.locate(yaml_topology)
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            cached = self._cache.get(path)
+            if not cached or cached[0] != mtime:
+                with open(path, 'r') as yaml_file:
+                    topology = yaml.load(yaml_file, Loader=Loader)
+                cached = (mtime, compile_topology(
+                    topology, os.path.basename(path)))
+                self._cache[path] = cached
+        return copy.deepcopy(cached[1])
+
+
+registry = ScenarioRegistry()
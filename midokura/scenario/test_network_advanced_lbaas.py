@@ -54,8 +54,9 @@ class TestLoadBalancerAdvanced(manager.AdvancedNetworkScenarioTest,
     @classmethod
     def resource_setup(cls):
         super(TestLoadBalancerAdvanced, cls).resource_setup()
-        # With two backends and 25 requests, according to mdts
-        # 1/((1/2)^(25-1)) -> 1/16m chance of not hitting all backends
+        # With two backends the round robin verdict (see
+        # stats.uniformity_verdict) needs about 40 requests, 19 hits each
+        # bound both shares within 50% of 1/2 at a 0.001 significance
         cls.init_setup()
         cls.builder = TestLoadBalancerAdvanced(builder=True)
         cls.servers_and_keys = \
@@ -65,15 +66,19 @@ class TestLoadBalancerAdvanced(manager.AdvancedNetworkScenarioTest,
         # Get the server acting as the gateway
         cls.accesspoint = cls.servers_and_keys[-1]
 
-        # Get the server acting as the client
-        client_and_key = next(server
-                              for server in cls.servers_and_keys
-                              if 'client' in server['server']['name'])
+        # Get the servers acting as clients
+        clients_and_keys = [server
+                            for server in cls.servers_and_keys
+                            if 'client' in server['server']['name']]
+        client_and_key = clients_and_keys[0]
         net_name = client_and_key['server']['addresses'].keys()[0]
         net = cls.builder._get_network_by_name(net_name)[0]
         cls.pool['vip_subnet_id'] = net['subnets'][0]
-        # Get an ssh connection to the client
-        cls.request_client = cls.builder._get_remote_client(client_and_key)
+        # Get an ssh connection to the clients, the first one makes the
+        # single requests and all of them generate load
+        cls.request_clients = [cls.builder._get_remote_client(client)
+                               for client in clients_and_keys]
+        cls.request_client = cls.request_clients[0]
 
         # Get members
         cls.members_and_keys = [server
@@ -104,11 +109,19 @@ class TestLoadBalancerAdvanced(manager.AdvancedNetworkScenarioTest,
     def _make_client_request(self, command):
         return self.request_client.exec_command(command, 5).rstrip()
 
+    def _get_load_clients(self):
+        return [client.exec_command for client in self.request_clients]
+
     @test.attr(type='smoke')
     @test.services('compute', 'network')
     def test_network_lbaas_round_robin(self):
         super(TestLoadBalancerAdvanced, self).lbaas_round_robin()
 
+    @test.attr(type='smoke')
+    @test.services('compute', 'network')
+    def test_network_lbaas_round_robin_under_load(self):
+        super(TestLoadBalancerAdvanced, self).lbaas_round_robin_under_load()
+
     @test.attr(type='smoke')
     @test.services('compute', 'network')
     def test_network_lbaas_round_robin_with_session_persistence(self):
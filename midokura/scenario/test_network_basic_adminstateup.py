@@ -17,7 +17,9 @@ from tempest_lib import decorators
 from tempest import config
 from tempest import test
 
+from midokura.midotools import report
 from midokura.scenario import manager
+from midokura.scenario.test_network_helper_adminstateup import TestAdminStateUpHelper
 
 CONF = config.CONF
 LOG = manager.log.getLogger(__name__)
@@ -26,10 +28,25 @@ LOG = manager.log.getLogger(__name__)
 SCPATH = "/network_scenarios/"
 
 
-class TestAdminStateUp(manager.AdvancedNetworkScenarioTest):
+class TestAdminStateUp(manager.AdvancedNetworkScenarioTest,
+                       TestAdminStateUpHelper):
     """
         Scenario:
-        TBA
+            admin_state_up propagation
+        Prerequisite:
+            1 tenant
+            1 network behind a public router
+            1 VM with FIP
+        Steps:
+            1) ping the FIP continuously from the exterior
+            2) set the router, network or port of the VM down, then up
+               again
+        Expected result:
+            the FIP stops answering once the resource is down and
+            answers again once it is up. The time from the API call
+            returning to the probes failing for good (down) and
+            answering again (up) is attached to the test output as JSON
+            (and appended to MIDO_BENCHMARK_RESULTS)
     """
 
     @classmethod
@@ -48,33 +65,50 @@ class TestAdminStateUp(manager.AdvancedNetworkScenarioTest):
         self.check_public_network_connectivity(
             ip_address, ssh_login, private_key, should_connect)
 
+    def _measure_toggle(self, resource, set_state):
+        def set_resource_state(state):
+            # the update body is not a return time (see _set_state)
+            set_state(state)
+
+        probers = self._start_probers(self.servers_and_keys[:1])
+        try:
+            result = self._toggle(set_resource_state, probers)[0]
+        finally:
+            for prober in probers:
+                prober.stop()
+        result['resource'] = resource
+        LOG.info("%s admin state propagation: %s", resource, result)
+        report.publish(self, 'adminstateup_%s' % resource, result)
+        self.assertIsNotNone(result['down_s'],
+                             "%s down did not stop the traffic" % resource)
+        self.assertIsNotNone(result['up_s'],
+                             "%s up did not bring the traffic back"
+                             % resource)
+
     def _check_vm_connectivity_router(self):
         router = self._get_tenant_router_by_name('router-smoke')
-        self.network_client.update_router(
-            router['id'], admin_state_up=False)
         LOG.info("router test")
-        self._check_connection(False)
-        self.network_client.update_router(
-            router['id'], admin_state_up=True)
+        self._measure_toggle(
+            'router',
+            lambda state: self.network_client.update_router(
+                router['id'], admin_state_up=state))
 
     def _check_vm_connectivity_net(self):
-        for network in self.networks:
+        for network in self._get_network_by_name('netA'):
             LOG.info("network test")
-            self.network_client.update_network(
-                network['id'], admin_state_up=False)
-            self._check_connection(False)
-            self.network_client.update_network(
-                network['id'], admin_state_up=True)
+            self._measure_toggle(
+                'network',
+                lambda state: self.network_client.update_network(
+                    network['id'], admin_state_up=state))
 
     def _check_vm_connectivity_port(self):
         LOG.info("port test")
         floating_ip = self.servers_and_keys[0]['FIP']
         port_id = floating_ip.get("port_id")
-        self.network_client.update_port(
-            port_id, admin_state_up=False)
-        self._check_connection(False)
-        self.network_client.update_port(
-            port_id, admin_state_up=True)
+        self._measure_toggle(
+            'port',
+            lambda state: self.network_client.update_port(
+                port_id, admin_state_up=state))
 
     @test.attr(type='smoke')
     @test.services('compute', 'network')
@@ -14,12 +14,15 @@
 import itertools
 import os
 
+from tempest import config
 from tempest import test
 
 from midokura.scenario import manager
 
+CONF = config.CONF
 LOG = manager.log.getLogger(__name__)
 SCPATH = "/network_scenarios/"
+TOPOLOGY = '{0}scenario_basic_inter_vmconnectivity.yaml'.format(SCPATH)
 
 
 class TestNetworkBasicInterVMConnectivity(manager.AdvancedNetworkScenarioTest):
@@ -40,7 +43,7 @@ class TestNetworkBasicInterVMConnectivity(manager.AdvancedNetworkScenarioTest):
         3. verify that 2 VMs can ping each other
 
         Expected results:
-        ping works
+        ping works, as computed from the scenario definition
     """
 
     @classmethod
@@ -48,8 +51,7 @@ class TestNetworkBasicInterVMConnectivity(manager.AdvancedNetworkScenarioTest):
         super(TestNetworkBasicInterVMConnectivity, cls).resource_setup()
         cls.builder = TestNetworkBasicInterVMConnectivity(builder=True)
         cls.servers_and_keys = cls.builder.setup_topology(
-            os.path.abspath(
-                '{0}scenario_basic_inter_vmconnectivity.yaml'.format(SCPATH)))
+            os.path.abspath(TOPOLOGY))
 
     @test.attr(type='smoke')
     @test.services('compute', 'network')
@@ -80,7 +82,12 @@ class TestNetworkBasicInterVMConnectivity(manager.AdvancedNetworkScenarioTest):
                      % (pair[0][0], pair[1][0]))
             nhops = hops + [pair[0]]
             self._ssh_through_gateway(nhops, pair[1])
-            LOG.info("Checking ping between %s %s"
-                     % (pair[0][0], pair[1][0]))
-            self._ping_through_gateway(hops, pair[1])
+        LOG.info("Checking ping between all the servers")
+        matrix = self.check_connectivity_matrix(
+            self.servers_and_keys[:-1],
+            access_point=ap_details,
+            retry_for=CONF.compute.ping_timeout)
+        expected = self.expected_connectivity(os.path.abspath(TOPOLOGY),
+                                              self.servers_and_keys)
+        self.assert_connectivity(expected, matrix)
         LOG.info("test finished, tearing down now ....")
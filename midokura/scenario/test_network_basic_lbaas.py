@@ -11,8 +11,13 @@
 #    under the License.
 
 import os
+import signal
+import subprocess
+import tempfile
+import time
 
 from tempest import config
+from tempest import exceptions
 from tempest import test
 
 from midokura.scenario import manager
@@ -56,8 +61,9 @@ class TestLoadBalancerBasic(manager.AdvancedNetworkScenarioTest,
     @classmethod
     def resource_setup(cls):
         super(TestLoadBalancerBasic, cls).resource_setup()
-        # With two backends and 25 requests, according to mdts
-        # 1/((1/2)^(25-1)) -> 1/16m chance of not hitting all backends
+        # With two backends the round robin verdict (see
+        # stats.uniformity_verdict) needs about 40 requests, 19 hits each
+        # bound both shares within 50% of 1/2 at a 0.001 significance
         cls.init_setup()
         cls.builder = TestLoadBalancerBasic(builder=True)
         cls.servers_and_keys = \
@@ -92,11 +98,37 @@ class TestLoadBalancerBasic(manager.AdvancedNetworkScenarioTest,
     def _make_client_request(self, command):
         return os.popen(command).read().rstrip()
 
+    def _get_load_clients(self):
+        # The load comes from the tempest host, like the requests
+        def run_locally(command, timeout):
+            # the output goes to a file, a full pipe would block the
+            # client while it is polled; on timeout its whole process
+            # group is killed
+            with tempfile.TemporaryFile() as output:
+                proc = subprocess.Popen(command, shell=True, stdout=output,
+                                        preexec_fn=os.setsid)
+                deadline = time.time() + timeout
+                while proc.poll() is None:
+                    if time.time() > deadline:
+                        os.killpg(proc.pid, signal.SIGKILL)
+                        proc.wait()
+                        raise exceptions.TimeoutException(
+                            "Load client did not finish in %ss" % timeout)
+                    time.sleep(0.5)
+                output.seek(0)
+                return output.read()
+        return [run_locally]
+
     @test.attr(type='smoke')
     @test.services('compute', 'network')
     def test_network_lbaas_round_robin(self):
         super(TestLoadBalancerBasic, self).lbaas_round_robin()
 
+    @test.attr(type='smoke')
+    @test.services('compute', 'network')
+    def test_network_lbaas_round_robin_under_load(self):
+        super(TestLoadBalancerBasic, self).lbaas_round_robin_under_load()
+
     @test.attr(type='smoke')
     @test.services('compute', 'network')
     def test_network_lbaas_round_robin_with_session_persistence(self):
@@ -13,32 +13,41 @@
 import re
 import os
 import testtools
+import time
 
 from tempest import test
 from tempest import config
 
+from midokura.midotools import report
 from midokura.scenario import manager
+from midokura.scenario.test_network_helper_live_migrate import TestLiveMigrateHelper
 
 LOG = manager.log.getLogger(__name__)
 SCPATH = "/network_scenarios/"
 CONF = config.CONF
 
-class TestNetworkBasicLiveMigrate(manager.AdvancedNetworkScenarioTest):
+class TestNetworkBasicLiveMigrate(manager.AdvancedNetworkScenarioTest,
+                                  TestLiveMigrateHelper):
     """
         Scenario:
             Live migration
         Prerequisite:
             1 tenant
             1 network
-            1 vm
+            2 vms with FIP, one to migrate and a peer
         Steps:
-            1) spawn the VM
+            1) spawn the VMs
             2) do an ssh to the VM's FIP
             3) SSH to the VM using the FIP from the exterior
             4) Keep SSH session open
-            5) Live migrate the VM
+            5) Start pinging the VM from the peer, and opening TCP
+               connections to its FIP from the exterior
+            6) Live migrate the VM
         Expected result:
-            SSH connection remains open after migration
+            SSH connection remains open after migration.
+            The blackout, lost probes and time to re-establish the flows
+            once the VM is on the new host are attached to the test
+            output as JSON (and appended to MIDO_BENCHMARK_RESULTS)
     """
 
     @classmethod
@@ -49,14 +58,6 @@ class TestNetworkBasicLiveMigrate(manager.AdvancedNetworkScenarioTest):
             os.path.abspath(
                 '{0}scenario_basic_live_migrate.yaml'.format(SCPATH)))
 
-    def _get_compute_other_than(self, current_host):
-        ## Get all hostnames
-        all_hosts = self._get_compute_hostnames()
-        ## Get hostname other than current hostname
-        for host in all_hosts:
-            if host != current_host:
-                return host
-
     @testtools.skipUnless(CONF.compute_feature_enabled.live_migration,
                           'Live migration not available')
     @test.attr(type='smoke')
@@ -66,7 +67,13 @@ class TestNetworkBasicLiveMigrate(manager.AdvancedNetworkScenarioTest):
             raise self.skipTest(
                 "Less than 2 compute nodes, skipping migration test.")
 
+        peer_def = next(server_def for server_def in self.servers_and_keys
+                        if 'peer' in server_def['server']['name'])
+        peer_client = self._get_peer_client(peer_def)
+        results = []
         for server_def in self.servers_and_keys:
+            if server_def is peer_def:
+                continue
             server = server_def['server']
             hops = [(server_def['FIP'].floating_ip_address,
                      server_def['keypair']['private_key'])]
@@ -77,15 +84,29 @@ class TestNetworkBasicLiveMigrate(manager.AdvancedNetworkScenarioTest):
             # Pick a target host different than current host
             current_host = self._get_host_for_server(server['id'])
             target_host = self._get_compute_other_than(current_host)
-            # Migrate server with block migration and wait for server status active
-            body = self.admin_manager.servers_client.live_migrate_server(
-                server['id'],
-                target_host,
-                True) # True for block live migration
-            self.admin_manager.servers_client.wait_for_server_status(server['id'], 'ACTIVE')
+            probers = self._start_probes(server_def, peer_client)
+            try:
+                time.sleep(self.PROBE_MARGIN)
+                start, migrated = self._migrate_servers(
+                    [(server, target_host)])[server['id']]
+                time.sleep(self.PROBE_MARGIN)
+            finally:
+                for prober in probers:
+                    prober.stop()
+            result = self._migration_downtime(probers, start, migrated,
+                                              time.time())
+            result.update(server=server['name'],
+                          source_host=current_host,
+                          target_host=target_host,
+                          duration_s=round(migrated - start, 2),
+                          resolution_s=self.MIGRATION_POLL)
+            LOG.info("Live migration of %s: %s", server['name'], result)
+            results.append(result)
             self.assertEqual(target_host, self._get_host_for_server(server['id']))
             # Check that the ssh connection is still open
             vm_host2 = client.exec_command("hostname")
             self.assertTrue(vm_host1 == vm_host2)
 
+        report.publish(self, 'live_migration', results)
+        self._check_recovered(results, [prober.name for prober in probers])
         LOG.info("test finished, tearing down now ....")
@@ -0,0 +1,102 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+
+from tempest import test
+
+from midokura.midotools import report
+from midokura.midotools import traffic
+from midokura.scenario import manager
+
+LOG = manager.log.getLogger(__name__)
+SCPATH = "/network_scenarios/"
+
+
+class TestNetworkBenchmarkConnectionRate(
+        manager.AdvancedNetworkScenarioTest):
+    """
+        Scenario:
+            New connections per second through the flow path
+        Prerequisite:
+            the throughput benchmark topology:
+            1 tenant
+            2 networks behind a public router
+            3 VMs, 2 of them with FIP
+            access point
+        Steps:
+            1) start a forking responder on the server VM
+            2) upload the client loop to the client VM
+            3) open short TCP connections, then UDP request/responses,
+               across the router and through SNAT to the server's FIP,
+               for SECONDS with WORKERS clients in parallel
+        Expected result:
+            connections get established on every path. The new
+            connections per second, first packet latency and failure
+            rate are attached to the test output as JSON (and appended
+            to MIDO_BENCHMARK_RESULTS)
+    """
+
+    SECONDS = 30
+    WORKERS = 20
+
+    @classmethod
+    def resource_setup(cls):
+        super(TestNetworkBenchmarkConnectionRate, cls).resource_setup()
+        cls.builder = TestNetworkBenchmarkConnectionRate(builder=True)
+        cls.servers_and_keys = cls.builder.setup_topology(
+            os.path.abspath(
+                '{0}scenario_benchmark_throughput.yaml'.format(SCPATH)))
+
+    def _measure_connection_rate(self, path, source, target, address,
+                                 protocol):
+        access_point = self.servers_and_keys[-1]
+        server = self._get_source_client(target, access_point)
+        client = self._get_source_client(source, access_point)
+        client.exec_command(traffic.upload_command(
+            traffic.CONNECTION_CLIENT_PATH, traffic.CONNECTION_CLIENT))
+        server.exec_command(traffic.rate_server_command())
+        try:
+            output = client.exec_command(
+                traffic.connection_rate_command(protocol, address,
+                                                self.SECONDS, self.WORKERS),
+                cmd_timeout=self.SECONDS + 60)
+        finally:
+            server.exec_command(traffic.STOP_RATE_SERVER)
+        result = traffic.connection_rate_result(protocol, output,
+                                                self.SECONDS)
+        result.update(path=path,
+                      workers=self.WORKERS,
+                      source=source['server']['name'],
+                      target=target['server']['name'],
+                      address=address)
+        LOG.info("%s %s: %s connections/s, %s failed",
+                 path, protocol, result['connections_per_second'],
+                 result['failure_rate'])
+        return result
+
+    @test.attr(type='benchmark')
+    @test.services('compute', 'network')
+    def test_network_benchmark_connection_rate(self):
+        paths = self._select_paths(self.servers_and_keys[:-1])
+        results = []
+        for path in ['routed', 'fip']:
+            source, target, address = paths[path]
+            for protocol in ['tcp', 'udp']:
+                results.append(self._measure_connection_rate(
+                    path, source, target, address, protocol))
+        report.publish(self, 'connection_rate', results)
+        for result in results:
+            self.assertTrue(result['established'] > 0,
+                            "No %s connection on the %s path"
+                            % (result['protocol'], result['path']))
+        LOG.info("test finished, tearing down now ....")
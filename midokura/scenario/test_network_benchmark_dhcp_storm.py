@@ -0,0 +1,103 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+
+from tempest import test
+
+from midokura.midotools import dhcp
+from midokura.midotools import parallel
+from midokura.midotools import report
+from midokura.midotools import stats
+from midokura.scenario import manager
+
+LOG = manager.log.getLogger(__name__)
+# path should be described in tempest.conf
+SCPATH = "/network_scenarios/"
+
+
+class TestNetworkBenchmarkDhcpStorm(manager.AdvancedNetworkScenarioTest):
+    """
+        Scenario:
+            DHCP lease storm, every VM of a network renews its lease
+            at the same moment
+
+        Pre-requisites:
+            1 tenant
+            1 network with a host route and a DNS server
+            30 VMs
+            access point
+
+        Steps:
+            1) open an ssh session to every VM through the access point
+            2) make the DHCP client of all the VMs renew at once
+            3) check the routes and DNS of the renewed leases
+
+        Expected results:
+            every VM gets a lease with the host route
+            172.20.0.0/24 via 10.10.10.10 and the DNS 8.8.8.8.
+            The lease renewal time of every VM and the failures are
+            attached to the test output as JSON (and appended to
+            MIDO_BENCHMARK_RESULTS)
+    """
+
+    @classmethod
+    def resource_setup(cls):
+        super(TestNetworkBenchmarkDhcpStorm, cls).resource_setup()
+        cls.builder = TestNetworkBenchmarkDhcpStorm(builder=True)
+        cls.servers_and_keys = cls.builder.setup_topology(
+            os.path.abspath(
+                '{0}scenario_benchmark_dhcp_storm.yaml'.format(SCPATH)))
+
+    def _check_lease(self, name, output):
+        lease = dhcp.parse_lease_output(output)
+        return dict(server=name,
+                    acquired=lease['acquired'],
+                    seconds=lease['seconds'],
+                    routes=any(route.is_custom_route("172.20.0.0",
+                                                     "10.10.10.10")
+                               for route in lease['routes']),
+                    dns=lease['dns'] == ["8.8.8.8"])
+
+    @test.attr(type='benchmark')
+    @test.services('compute', 'network')
+    def test_network_benchmark_dhcp_storm(self):
+        access_point = self.servers_and_keys[-1]
+        servers = self.servers_and_keys[:-1]
+        clients = parallel.run_concurrently(
+            lambda server: self._get_source_client(server, access_point),
+            servers, workers=manager.API_WORKERS)
+        # The sessions are opened beforehand, so the leases are asked
+        # for at the same time
+        parallel.run_concurrently(lambda client: client.exec_command("true"),
+                                  clients, workers=manager.API_WORKERS)
+        command = dhcp.lease_command()
+        outputs = parallel.run_concurrently(
+            lambda client: client.exec_command(command, 60), clients)
+        leases = [self._check_lease(server['server']['name'], output)
+                  for server, output in zip(servers, outputs)]
+        report.publish(self, 'dhcp_storm', dict(
+            servers=len(leases),
+            failures=len([lease for lease in leases
+                          if not lease['acquired']]),
+            seconds=stats.summarize([lease['seconds'] for lease in leases
+                                     if lease['acquired']]),
+            leases=leases))
+        for lease in leases:
+            self.assertTrue(lease['acquired'],
+                            "%s did not get a lease" % lease['server'])
+            self.assertTrue(lease['routes'],
+                            "%s did not get the host route"
+                            % lease['server'])
+            self.assertTrue(lease['dns'],
+                            "%s did not get the DNS" % lease['server'])
+        LOG.info("test finished, tearing down now ....")
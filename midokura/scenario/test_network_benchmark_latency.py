@@ -0,0 +1,89 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+
+from tempest import test
+
+from midokura.midotools import parallel
+from midokura.midotools import report
+from midokura.midotools import stats
+from midokura.scenario import manager
+
+LOG = manager.log.getLogger(__name__)
+SCPATH = "/network_scenarios/"
+
+
+class TestNetworkBenchmarkLatency(manager.AdvancedNetworkScenarioTest):
+    """
+        Scenario:
+            RTT distribution per path
+        Prerequisite:
+            2 tenants, each one with
+            2 networks behind a public router
+            3 VMs, 2 of them with FIP
+            access point
+        Steps:
+            1) pick a pair of VMs of the first tenant for every path: same
+               network, across the router, through a FIP and across
+               compute hosts, and a VM of the second tenant (through its
+               FIP) for the cross tenant path
+            2) ping every path with a long series at the same time
+        Expected result:
+            every path answers. The min/p50/p90/p99/max rtt, jitter and
+            loss of every path are attached to the test output as JSON
+            (and appended to MIDO_BENCHMARK_RESULTS)
+    """
+
+    COUNT = 60
+
+    @classmethod
+    def resource_setup(cls):
+        super(TestNetworkBenchmarkLatency, cls).resource_setup()
+        cls.builder = TestNetworkBenchmarkLatency(builder=True)
+        cls.tenants = cls.builder.setup_topology(
+            os.path.abspath(
+                '{0}scenario_benchmark_latency.yaml'.format(SCPATH)))
+
+    def _measure_latency(self, access_point, path, source, target, address):
+        client = self._get_source_client(source, access_point)
+        rtts = client.latency_series(address, count=self.COUNT)
+        result = stats.summarize(rtts, sent=self.COUNT)
+        result.update(path=path,
+                      protocol='icmp',
+                      source=source['server']['name'],
+                      target=target['server']['name'],
+                      address=address)
+        LOG.info("%s latency: %s", path, result)
+        return result
+
+    @test.attr(type='benchmark')
+    @test.services('compute', 'network')
+    def test_network_benchmark_latency(self):
+        local = self.tenants[0]['servers_and_keys']
+        remote = self.tenants[1]['servers_and_keys']
+        access_point = local[-1]
+        paths = self._select_paths(local[:-1])
+        target = [server for server in remote[:-1] if server.get('FIP')][0]
+        paths['cross_tenant'] = (local[0], target,
+                                 target['FIP'].floating_ip_address)
+        LOG.info("Measuring latency of the paths: %s", sorted(paths))
+
+        results = parallel.run_concurrently(
+            lambda item: self._measure_latency(access_point, item[0],
+                                               *item[1]),
+            sorted(paths.items()))
+        report.publish(self, 'latency', results)
+        for result in results:
+            self.assertTrue(result['count'] > 0,
+                            "No answer on the %s path" % result['path'])
+        LOG.info("test finished, tearing down now ....")
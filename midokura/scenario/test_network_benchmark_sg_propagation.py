@@ -0,0 +1,157 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import time
+
+from tempest import config
+from tempest import test
+
+from midokura.midotools import connectivity
+from midokura.midotools import parallel
+from midokura.midotools import probing
+from midokura.midotools import report
+from midokura.midotools import waiters
+from midokura.scenario import manager
+
+CONF = config.CONF
+LOG = manager.log.getLogger(__name__)
+SCPATH = "/network_scenarios/"
+
+
+class TestNetworkBenchmarkSGPropagation(manager.AdvancedNetworkScenarioTest):
+    """
+        Scenario:
+            Security group rule propagation latency
+        Prerequisite:
+            1 tenant
+            1 network
+            2 VMs, a prober and a target whose security group
+            only allows ssh
+            access point
+        Steps:
+            1) start the tcp responder on the target
+            2) probe it from the prober continuously, through the tunnel
+            3) for every rule-set size, grow the target's security group
+               with unrelated rules, then add the rule allowing the
+               probes and remove it again
+        Expected result:
+            the probes get through once the rule is added and stop once
+            it is removed. The time from the API call returning to the
+            datapath enforcing the change (allow and deny) per rule-set
+            size is attached to the test output as JSON (and appended to
+            MIDO_BENCHMARK_RESULTS). The resolution is the probe period,
+            an ssh command through the tunnel.
+    """
+
+    # rules of the security group besides ssh and the probed one
+    RULE_SET_SIZES = (0, 10, 50, 100)
+    # first port of the unrelated rules
+    FILLER_PORT = 20000
+    # a removed rule is enforced once the probes fail for this long
+    DENY_STABLE_FOR = 3
+
+    @classmethod
+    def resource_setup(cls):
+        super(TestNetworkBenchmarkSGPropagation, cls).resource_setup()
+        cls.builder = TestNetworkBenchmarkSGPropagation(builder=True)
+        cls.servers_and_keys = cls.builder.setup_topology(
+            os.path.abspath(
+                '{0}scenario_benchmark_sg_propagation.yaml'.format(SCPATH)))
+
+    def _get_server(self, name):
+        return next(server_def for server_def in self.servers_and_keys[:-1]
+                    if name in server_def['server']['name'])
+
+    def _add_rules(self, secgroup, ports):
+        parallel.run_concurrently(
+            lambda port: self._create_security_group_rule(
+                client=self.network_client,
+                secgroup=secgroup,
+                direction='ingress',
+                protocol='tcp',
+                port_range_min=port,
+                port_range_max=port),
+            ports, workers=manager.API_WORKERS)
+
+    def _measure(self, prober, secgroup, rules):
+        """
+        Adds the rule allowing the probes, waits for them to get through,
+        removes it and waits for them to fail
+        :returns: dict with the allow and deny latencies in seconds
+        """
+        timeout = CONF.compute.ping_timeout
+        rule = self._create_security_group_rule(
+            client=self.network_client,
+            secgroup=secgroup,
+            direction='ingress',
+            protocol='tcp',
+            port_range_min=connectivity.PROBE_PORT,
+            port_range_max=connectivity.PROBE_PORT)
+        allowed = prober.mark('allowed')
+        waiters.poll(lambda: probing.first_after(prober.samples(), allowed,
+                                                 bool),
+                     timeout)
+        rule.delete()
+        denied = prober.mark('denied')
+        waiters.poll(lambda: prober.last(), timeout, expected=False,
+                     stable_for=self.DENY_STABLE_FOR)
+        samples = prober.samples()
+        allow = probing.first_after(samples, allowed, bool)
+        deny = probing.settled_after(samples, denied,
+                                     lambda result: not result)
+        return dict(rules=rules,
+                    allow_s=round(allow - allowed, 2) if allow else None,
+                    deny_s=round(deny - denied, 2) if deny else None)
+
+    @test.attr(type='benchmark')
+    @test.services('compute', 'network')
+    def test_network_benchmark_sg_propagation(self):
+        access_point = self.servers_and_keys[-1]
+        target = self._get_server('target')
+        address = self._fixed_addresses(target['server'])[0][1]
+        target_client = self._get_source_client(target, access_point)
+        prober_client = self._get_source_client(self._get_server('prober'),
+                                                access_point)
+        secgroup = self._get_security_group_by_name('sgprobe')
+
+        target_client.exec_command(connectivity.responders_command())
+        self.addCleanup(target_client.exec_command,
+                        connectivity.STOP_RESPONDERS)
+        # a single try, the verdicts come from series of probes
+        command = connectivity.probe_command([address], ('tcp',),
+                                             attempts=1)
+
+        def probe():
+            output = prober_client.exec_command(command)
+            return connectivity.parse_probe_output(output)[0][3] or None
+
+        results = []
+        fillers = 0
+        with probing.Prober(probe, name='sg probe') as prober:
+            for size in self.RULE_SET_SIZES:
+                self._add_rules(secgroup,
+                                range(self.FILLER_PORT + fillers,
+                                      self.FILLER_PORT + size))
+                fillers = max(fillers, size)
+                result = self._measure(prober, secgroup, fillers)
+                LOG.info("Security group with %d rules: %s", fillers, result)
+                results.append(result)
+        report.publish(self, 'sg_propagation', results)
+        for result in results:
+            self.assertIsNotNone(result['allow_s'],
+                                 "Adding the rule with %d rules did not "
+                                 "allow the probes" % result['rules'])
+            self.assertIsNotNone(result['deny_s'],
+                                 "Removing the rule with %d rules did not "
+                                 "deny the probes" % result['rules'])
+        LOG.info("test finished, tearing down now ....")
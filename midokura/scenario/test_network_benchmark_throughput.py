@@ -0,0 +1,92 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+
+from tempest import test
+
+from midokura.midotools import report
+from midokura.midotools import traffic
+from midokura.scenario import manager
+
+LOG = manager.log.getLogger(__name__)
+SCPATH = "/network_scenarios/"
+
+
+class TestNetworkBenchmarkThroughput(manager.AdvancedNetworkScenarioTest):
+    """
+        Scenario:
+            Data plane throughput between VMs
+        Prerequisite:
+            1 tenant
+            2 networks behind a public router
+            3 VMs, 2 of them with FIP
+            access point
+        Steps:
+            1) pick a pair of VMs for every path: same network, across
+               the router, through a FIP and across compute hosts
+            2) send a bulk TCP stream and a bulk UDP stream on each path
+            3) count the bytes the receiver gets
+        Expected result:
+            every TCP stream gets through. The goodput and loss of every
+            stream are attached to the test output as JSON (and appended
+            to MIDO_BENCHMARK_RESULTS)
+    """
+
+    TCP_BYTES = 32 * 1024 * 1024
+    UDP_BYTES = 8 * 1024 * 1024
+
+    @classmethod
+    def resource_setup(cls):
+        super(TestNetworkBenchmarkThroughput, cls).resource_setup()
+        cls.builder = TestNetworkBenchmarkThroughput(builder=True)
+        cls.servers_and_keys = cls.builder.setup_topology(
+            os.path.abspath(
+                '{0}scenario_benchmark_throughput.yaml'.format(SCPATH)))
+
+    def _measure_stream(self, path, source, target, address, protocol):
+        access_point = self.servers_and_keys[-1]
+        sink = self._get_source_client(target, access_point)
+        sender = self._get_source_client(source, access_point)
+        sink.exec_command(traffic.sink_command(protocol))
+        size = self.TCP_BYTES if protocol == 'tcp' else self.UDP_BYTES
+        output = sender.exec_command(
+            traffic.source_command(protocol, address, size),
+            cmd_timeout=600)
+        result = traffic.stream_result(
+            protocol, output, sink.exec_command(traffic.STOP_SINK))
+        result.update(path=path,
+                      source=source['server']['name'],
+                      target=target['server']['name'],
+                      address=address)
+        LOG.info("%s %s stream: %.2f Mbit/s, %s lost",
+                 path, protocol, result['goodput_mbps'], result['loss'])
+        return result
+
+    @test.attr(type='benchmark')
+    @test.services('compute', 'network')
+    def test_network_benchmark_throughput(self):
+        paths = self._select_paths(self.servers_and_keys[:-1])
+        LOG.info("Measuring throughput of the paths: %s", sorted(paths))
+        results = []
+        for path, (source, target, address) in sorted(paths.items()):
+            for protocol in ['tcp', 'udp']:
+                results.append(self._measure_stream(path, source, target,
+                                                    address, protocol))
+        report.publish(self, 'throughput', results)
+        for result in results:
+            if result['protocol'] == 'tcp':
+                self.assertEqual(result['bytes_sent'],
+                                 result['bytes_received'],
+                                 "TCP stream on the %s path was cut"
+                                 % result['path'])
+        LOG.info("test finished, tearing down now ....")
@@ -0,0 +1,104 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import functools
+import subprocess
+import time
+
+from tempest import config
+
+from midokura.midotools import parallel
+from midokura.midotools import probing
+from midokura.midotools import waiters
+from midokura.scenario import manager
+
+CONF = config.CONF
+LOG = manager.log.getLogger(__name__)
+
+
+class TestAdminStateUpHelper():
+    """
+        Scenario:
+        Helper class to factor common code between the admin state
+        scenarios. The description should be found on the
+        implementation test class.
+    """
+
+    def _ping(self, ip_address):
+        proc = subprocess.Popen(['ping', '-c1', '-w1', ip_address],
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+        proc.communicate()
+        return proc.returncode == 0 or None
+
+    def _start_probers(self, servers_and_keys):
+        return [probing.Prober(functools.partial(self._ping, ip_address),
+                               name=ip_address).start()
+                for ip_address in [server['FIP'].floating_ip_address
+                                   for server in servers_and_keys]]
+
+    def _set_state(self, set_state, state, probers):
+        """
+        :returns: per prober, the time the API call for its resource
+                  returned: set_state may return a list of them, in the
+                  order of the probers (see _set_ports_state), anything
+                  else (e.g. the body of a single update) stands for the
+                  time set_state returned
+        """
+        returned = set_state(state)
+        now = time.time()
+        if not isinstance(returned, list):
+            return [now] * len(probers)
+        self.assertEqual(len(probers), len(returned),
+                         "Expected a return time per prober")
+        return returned
+
+    def _set_ports_state(self, port_ids, state):
+        """
+        Updates the ports concurrently
+        :returns: the time every update returned, by position
+        """
+        def update(port_id):
+            self.network_client.update_port(port_id, admin_state_up=state)
+            return time.time()
+        return parallel.run_concurrently(update, port_ids,
+                                         workers=manager.API_WORKERS)
+
+    def _toggle(self, set_state, probers):
+        """
+        Sets the admin state down and up again with set_state(state)
+        while the FIPs are probed
+        :returns: per prober, the seconds from the API call for its
+                  resource returning to the probes failing for good
+                  (down_s), and to them answering again (up_s)
+        """
+        timeout = CONF.compute.ping_timeout
+        downs = self._set_state(set_state, False, probers)
+        waiters.poll(lambda: any(prober.last() for prober in probers),
+                     timeout, expected=False,
+                     stable_for=manager.UNREACHABLE_STABLE_FOR)
+        ups = self._set_state(set_state, True, probers)
+        waiters.poll(lambda: all(probing.first_after(prober.samples(), up,
+                                                     bool)
+                                 for prober, up in zip(probers, ups)),
+                     timeout)
+        results = []
+        for prober, down, up in zip(probers, downs, ups):
+            samples = prober.samples()
+            went_down = probing.settled_after(
+                samples, down, lambda result: not result, until=up)
+            came_up = probing.first_after(samples, up, bool)
+            results.append(dict(
+                fip=prober.name,
+                down_s=round(went_down - down, 2) if went_down else None,
+                up_s=round(came_up - up, 2) if came_up else None))
+        return results
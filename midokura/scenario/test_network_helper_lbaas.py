@@ -15,6 +15,12 @@ import time
 from tempest import config
 from tempest import exceptions
 
+from midokura.midotools import parallel
+from midokura.midotools import probing
+from midokura.midotools import report
+from midokura.midotools import stats
+from midokura.midotools import traffic
+from midokura.midotools import waiters
 from midokura.scenario import manager
 
 CONF = config.CONF
@@ -32,29 +38,53 @@ class TestLoadBalancerHelper():
     @classmethod
     def init_setup(cls):
         ''' Should be called inside setUp method of test class'''
-        cls.num_requests = 25
+        # requests are sent until the balancing verdict is significant
+        cls.max_requests = 200
+        cls.significance = 0.001
+        # largest relative deviation of a member's share from 1/members
+        # still balanced uniformly
+        cls.balance_tolerance = 0.5
         cls.max_failures = 4
+        # seconds between sequential requests, the nc loop of the
+        # backends without tcpsvd respawns after every connection
+        cls.request_interval = 0.2
         cls.protocol_port = 8080
+        # requests in flight per load client in load generator mode
+        cls.load_concurrency = 10
+        cls.load_requests = 200
+        cls.health_monitor = {
+            "type": "TCP",
+            "delay": 1,
+            "timeout": 1,
+            "max_retries": 3}
+        # seconds the VIP is probed before failing a member, and the
+        # longest failover or recovery waited for
+        cls.failover_baseline = 5
+        cls.failover_timeout = 60
 
     def _start_servers(self):
+        self.backends = {}
         for server in self.members_and_keys:
             self._start_server(server)
 
     def _start_server(self, server):
-        # Start netcat command
+        # Upload and start the responder, answering with the server name
         server_name = server['server']['name']
-        start_server = 'while true; do ' \
-                       'nc -l -p %d -e echo %s; ' \
-                       'done &' % (self.protocol_port, server_name)
         linux_client = self._get_remote_client(server)
-        linux_client.exec_command(start_server)
+        linux_client.exec_command(
+            traffic.backend_command(server_name, self.protocol_port))
+        self.backends[server_name] = linux_client
         self.addCleanup(self._stop_server, server, linux_client)
 
     def _stop_server(self, server, linux_client):
-        # Stop netcat command
-        while_pid = linux_client.exec_command("ps aux|grep while|head -n 1").split()[0]
-        stop_server = 'kill -9 %s && killall -9 nc' % while_pid
-        linux_client.exec_command(stop_server)
+        linux_client.exec_command(traffic.STOP_BACKEND)
+
+    def _served_requests(self):
+        """
+        :returns: the requests every member served since it was started
+        """
+        return dict((name, int(client.exec_command(traffic.BACKEND_SERVED)))
+                    for name, client in self.backends.items())
 
     def __create_pool(self, pool_dict, lb_method, health_monitor):
         pool = self._create_pool(
@@ -62,12 +92,7 @@ class TestLoadBalancerHelper():
             protocol='TCP',
             subnet_id=pool_dict['subnet']['id'])
         if health_monitor:
-            create_kwargs = {
-                "type": "TCP",
-                "delay": 1,
-                "timeout": 1,
-                "max_retries": 3}
-            self._create_health_monitor(pool.id, create_kwargs)
+            self._create_health_monitor(pool.id, dict(self.health_monitor))
         self.assertTrue(pool)
         pool_dict['pool'] = pool
 
@@ -90,6 +115,76 @@ class TestLoadBalancerHelper():
         pool_dict['vip'] = vip
         self.assertTrue(vip)
 
+    def _create_load_balancers(self, pool_dicts, lb_method,
+                               health_monitor=False):
+        """
+        Scale variant of _create_load_balancer for many pools: the pools,
+        then all their members and health monitors, then the VIPs, are
+        created concurrently, and the creation time of every VIP is kept
+        in its pool dict ('vip_created').
+        :returns: dict with the seconds taken by the API calls of every
+                  step and until all the resources were ACTIVE
+        """
+        start = time.time()
+        timings = {}
+        pools = parallel.run_concurrently(
+            lambda pool_dict: self._create_pool(
+                lb_method=lb_method,
+                protocol='TCP',
+                subnet_id=pool_dict['subnet']['id']),
+            pool_dicts, workers=manager.API_WORKERS)
+        for pool_dict, pool in zip(pool_dicts, pools):
+            self.assertTrue(pool)
+            pool_dict['pool'] = pool
+        timings['pools_s'] = round(time.time() - start, 2)
+
+        calls = [(self._create_member,
+                  dict(address=ip_address,
+                       protocol_port=self.protocol_port,
+                       pool_id=pool_dict['pool'].id))
+                 for pool_dict in pool_dicts
+                 for ip_address, _, _ in pool_dict['members']]
+        if health_monitor:
+            calls.extend((self._create_health_monitor,
+                          dict(pool_id=pool_dict['pool'].id,
+                               kwargs=dict(self.health_monitor)))
+                         for pool_dict in pool_dicts)
+        step = time.time()
+        members = [member for member in parallel.run_concurrently(
+            lambda call: call[0](**call[1]), calls,
+            workers=manager.API_WORKERS) if member]
+        timings['members_s'] = round(time.time() - step, 2)
+
+        def create_vip(pool_dict):
+            pool_dict['vip'] = self._create_vip(
+                protocol='TCP',
+                protocol_port=self.protocol_port,
+                subnet_id=pool_dict['vip_subnet_id'],
+                pool_id=pool_dict['pool'].id)
+            pool_dict['vip_created'] = time.time()
+            self.assertTrue(pool_dict['vip'])
+        step = time.time()
+        parallel.run_concurrently(create_vip, pool_dicts,
+                                  workers=manager.API_WORKERS)
+        timings['vips_s'] = round(time.time() - step, 2)
+        timings['api_s'] = round(time.time() - start, 2)
+
+        timeout = CONF.network.build_timeout
+        pending = []
+        for kind, resources in (
+                ('pool', [pool_dict['pool'] for pool_dict in pool_dicts]),
+                ('member', members),
+                ('vip', [pool_dict['vip'] for pool_dict in pool_dicts])):
+            waiter = waiters.lbaas_waiter(self.network_client, kind, timeout)
+            for resource in resources:
+                waiter.add(resource.id, 'ACTIVE')
+            pending.append(waiter)
+        parallel.run_concurrently(lambda waiter: waiter.wait(), pending)
+        timings['active_s'] = round(time.time() - start, 2)
+        LOG.info("LOAD_BALANCER: %d pools, %d members provisioned %s"
+                 % (len(pool_dicts), len(members), timings))
+        return timings
+
     def _connect_to_server(self, ip):
         nc_command = "nc %s %d" % (ip, self.protocol_port)
         server = self._make_client_request(nc_command)
@@ -110,11 +205,31 @@ class TestLoadBalancerHelper():
                 message = "Timeout out trying to connecto to %s" % vip.address
                 raise exceptions.TimeoutException(message)
 
-    def _send_requests(self, vip, members):
+    def _balancing_verdict(self, counters, persistence):
+        """
+        :returns: None while undecided, otherwise whether the hits follow
+                  the balancing method: uniform for round robin, a single
+                  member with SOURCE_IP persistence
+        """
+        counts = [counter for member, counter in counters.items()
+                  if member != 'failures']
+        if persistence:
+            return stats.persistence_verdict(counts, self.significance)
+        return stats.uniformity_verdict(counts, self.significance,
+                                        self.balance_tolerance)
+
+    def _send_requests(self, vip, members, persistence=False):
+        """
+        Sends requests one after the other until the balancing verdict
+        is significant, max_requests or max_failures are reached.
+        """
         hostnames = [hostname for _, hostname, _ in members]
         counters = dict.fromkeys(hostnames, 0)
         counters.setdefault('failures', 0)
-        for i in range(self.num_requests):
+        verdict = None
+        while (verdict is None and
+               sum(counters.values()) < self.max_requests and
+               counters['failures'] < self.max_failures):
             server_response = self._connect_to_server(vip.address)
             if not server_response:
                 LOG.info(server_response)
@@ -123,32 +238,50 @@ class TestLoadBalancerHelper():
             else:
                 counters[server_response] += 1
                 LOG.info("LOAD_BALANCER: Hit %s" % server_response)
-            # Workarround to allow nc (busybox) to respawn, quite flacky
-            time.sleep(1)
+                verdict = self._balancing_verdict(counters, persistence)
+            time.sleep(self.request_interval)
         return counters
 
+    def _generate_load(self, vip, members, requests=None, concurrency=None):
+        """
+        Load generator mode: every load client (see _get_load_clients)
+        sends `requests` requests to the VIP, `concurrency` at a time, at
+        the same time as the other clients. The requests are timed and
+        counted on the clients, in a single command each.
+        :returns: traffic.load_result of all the clients
+        """
+        requests = requests or self.load_requests
+        concurrency = concurrency or self.load_concurrency
+        command = traffic.load_command(vip.address, self.protocol_port,
+                                       requests, concurrency)
+        timeout = requests * 3 + 60
+        outputs = parallel.run_concurrently(
+            lambda run: run(command, timeout), self._get_load_clients())
+        result = traffic.load_result(
+            outputs, [hostname for _, hostname, _ in members])
+        LOG.info("LOAD_BALANCER: load result %s" % result)
+        return result
+
     def _check_balancing_method(self, counters, persistence):
-        unique_members = [member
-                          for member, counter in counters.items()
-                          if counter > 0 and 'backend' in member]
-        all_members = [member
-                       for member, counter in counters.items()
-                       if 'backend' in member]
-        LOG.info("DEBUG ROUND ROBIN")
-        LOG.info("Failures %d" % counters['failures'])
-        LOG.info(unique_members)
-        LOG.info(all_members)
-        if not persistence:
-            self.assertTrue(len(unique_members) == len(all_members),
-                            "Not all members were balanced (ROUND_ROBIN)")
-        else:
-            LOG.info("WITH SOURCE_IP PERSISTENCE")
-            self.assertTrue(len(unique_members) == 1,
-                            "More than one backend was balanced (SOURCE_IP)")
+        verdict = self._balancing_verdict(counters, persistence)
+        LOG.info("LOAD_BALANCER: distribution %s after %d requests, "
+                 "persistence %s, verdict %s"
+                 % (counters, sum(counters.values()), persistence, verdict))
         # nc is quite flaky, support a minimum number of failures but report an
         # error when this number is high enough
         self.assertTrue(counters['failures'] < self.max_failures,
                         "Some requests failed to hit the backends")
+        if not persistence:
+            self.assertIsNotNone(verdict,
+                                 "No evidence of a uniform balancing "
+                                 "(ROUND_ROBIN) after %d requests"
+                                 % sum(counters.values()))
+            self.assertTrue(verdict,
+                            "Members were not balanced uniformly "
+                            "(ROUND_ROBIN)")
+        else:
+            self.assertTrue(verdict,
+                            "More than one backend was balanced (SOURCE_IP)")
 
     def lbaas_round_robin(self):
         self._start_servers()
@@ -160,6 +293,23 @@ class TestLoadBalancerHelper():
         self._check_balancing_method(counters, persistence=False)
         LOG.info("test finished, tearing down now ....")
 
+    def lbaas_round_robin_under_load(self):
+        self._start_servers()
+        self._create_load_balancer(self.pool, 'ROUND_ROBIN')
+        self._check_connection(self.pool['vip'])
+        served = self._served_requests()
+        result = self._generate_load(self.pool['vip'], self.pool['members'])
+        result['served'] = dict((name, count - served[name])
+                                for name, count
+                                in self._served_requests().items())
+        report.publish(self, 'lbaas_load', result)
+        self.assertTrue(all(result['hits'].values()),
+                        "Not all members were balanced under load")
+        self.assertTrue(sum(result['served'].values()) >=
+                        sum(result['hits'].values()),
+                        "The members served fewer requests than answered")
+        LOG.info("test finished, tearing down now ....")
+
     def lbaas_round_robin_with_session_persistence(self):
         self._start_servers()
         self._create_load_balancer(self.pool, 'ROUND_ROBIN')
@@ -168,31 +318,88 @@ class TestLoadBalancerHelper():
             self.pool['vip'].id,
             session_persistence={'type': 'SOURCE_IP'})
         counters = self._send_requests(self.pool['vip'],
-                                       self.pool['members'])
+                                       self.pool['members'],
+                                       persistence=True)
         self._check_balancing_method(counters, persistence=True)
         LOG.info("test finished, tearing down now ....")
 
-    def lbaas_health_monitoring(self):
-        self._start_servers()
-        self._create_load_balancer(self.pool, 'ROUND_ROBIN',
-                                   health_monitor=True)
-        counters = self._send_requests(self.pool['vip'],
-                                       self.pool['members'])
-        self._check_balancing_method(counters, persistence=False)
-
-        # Get the port to update up/down from the device_id
-        server_id = self.pool['members'][0][2]
+    def _measure_failover(self, pool_dict):
+        """
+        Continuous probe mode: the VIP is probed all along while the port
+        of the first member is set down and up again.
+        The detection time goes from setting the port down to the moment
+        the requests stop reaching the member for good, the recovery time
+        from setting it up to its first answer again.
+        :returns: dict with both times, the requests lost during the
+                  detection, and the health monitor settings
+        """
+        vip = pool_dict['vip']
+        _, failed, server_id = pool_dict['members'][0]
         server_port = self._list_ports(device_id=server_id)[0]
-        self.network_client.update_port(server_port['id'],
-                                        admin_state_up=False)
         # Bring up the port again to adminstateup True
         # at the end of the test
         self.addCleanup(self.network_client.update_port,
                         server_port['id'],
                         admin_state_up=True)
-        # Wait for the health monitor to detect the wakeup member
-        time.sleep(10)
+
+        def answered_by_others(result):
+            return result is not None and result != failed
+
+        prober = probing.Prober(
+            lambda: self._connect_to_server(vip.address), name='vip probe')
+        with prober:
+            time.sleep(self.failover_baseline)
+            down = prober.mark('down')
+            self.network_client.update_port(server_port['id'],
+                                            admin_state_up=False)
+            # the member must stay out long enough to rule out the round
+            # robin skipping it by chance
+            waiters.poll(lambda: answered_by_others(prober.last()),
+                         self.failover_timeout,
+                         stable_for=self.health_monitor['delay'] * 3)
+            up = prober.mark('up')
+            self.network_client.update_port(server_port['id'],
+                                            admin_state_up=True)
+            waiters.poll(lambda: probing.first_after(
+                prober.samples(), up, lambda result: result == failed),
+                self.failover_timeout)
+        samples = prober.samples()
+        detected = probing.settled_after(samples, down, answered_by_others,
+                                         until=up)
+        recovered = probing.first_after(samples, up,
+                                        lambda result: result == failed)
+        result = dict(self.health_monitor,
+                      member=failed,
+                      probes=len(samples),
+                      detection_s=(round(detected - down, 2)
+                                   if detected else None),
+                      # every retry waits for the delay and the last one
+                      # times out
+                      expected_detection_s=(
+                          self.health_monitor['delay'] *
+                          self.health_monitor['max_retries'] +
+                          self.health_monitor['timeout']),
+                      lost_during_detection=probing.count_between(
+                          samples, down, detected or up,
+                          lambda result: result is None),
+                      recovery_s=(round(recovered - up, 2)
+                                  if recovered else None))
+        LOG.info("LOAD_BALANCER: failover %s" % result)
+        return result
+
+    def lbaas_health_monitoring(self):
+        self._start_servers()
+        self._create_load_balancer(self.pool, 'ROUND_ROBIN',
+                                   health_monitor=True)
+        self._check_connection(self.pool['vip'])
         counters = self._send_requests(self.pool['vip'],
                                        self.pool['members'])
-        self._check_balancing_method(counters, persistence=True)
+        self._check_balancing_method(counters, persistence=False)
+
+        result = self._measure_failover(self.pool)
+        report.publish(self, 'lbaas_failover', result)
+        self.assertIsNotNone(result['detection_s'],
+                             "The failed member kept getting requests")
+        self.assertIsNotNone(result['recovery_s'],
+                             "The member did not get requests again")
         LOG.info("test finished, tearing down now ....")
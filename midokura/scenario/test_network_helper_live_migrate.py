@@ -0,0 +1,135 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import socket
+import time
+
+from tempest import config
+
+from midokura.midotools import parallel
+from midokura.midotools import probing
+from midokura.midotools import waiters
+from midokura.scenario import manager
+
+CONF = config.CONF
+LOG = manager.log.getLogger(__name__)
+
+
+class TestLiveMigrateHelper():
+    """
+        Scenario:
+        Helper class to factor common code between the live
+        migration scenarios. The description should be found on
+        the implementation test class.
+    """
+
+    # seconds probed before migrating and after the migration finished
+    PROBE_MARGIN = 5
+    # seconds between the listings of the migrating servers, the
+    # resolution of the time a migration is seen finished
+    MIGRATION_POLL = 0.5
+
+    def _get_compute_other_than(self, current_host):
+        ## Get all hostnames
+        all_hosts = self._get_compute_hostnames()
+        ## Get hostname other than current hostname
+        for host in all_hosts:
+            if host != current_host:
+                return host
+
+    def _get_peer_client(self, peer_def):
+        return self.setup_tunnel(
+            [(peer_def['FIP'].floating_ip_address,
+              peer_def['keypair']['private_key'])])
+
+    def _start_probes(self, server_def, peer_client):
+        """
+        :returns: the ICMP probes of the fixed address from the peer and
+                  the TCP probes of the FIP from the tempest host, started
+        """
+        address = self._fixed_addresses(server_def['server'])[0][1]
+        fip = server_def['FIP'].floating_ip_address
+
+        def icmp():
+            peer_client.exec_command("ping -c1 -W1 %s" % address)
+            return True
+
+        def tcp():
+            socket.create_connection((fip, 22), 1).close()
+            return True
+        return [probing.Prober(icmp, name='icmp').start(),
+                probing.Prober(tcp, name='tcp').start()]
+
+    def _migrate_servers(self, targets, workers=None):
+        """
+        Live migrates the servers at the same time and waits for all of
+        them to be ACTIVE again, with one list call of their tenant's
+        servers every MIGRATION_POLL seconds
+        :param targets: (server, target host) pairs
+        :returns: server id -> (start, migrated), the times the migration
+                  was asked for and seen finished
+        """
+        client = self.admin_manager.servers_client
+        starts = {}
+
+        def migrate(target):
+            server, target_host = target
+            starts[server['id']] = time.time()
+            # True for block live migration
+            client.live_migrate_server(server['id'], target_host, True)
+
+        parallel.run_concurrently(migrate, targets, workers=workers)
+        waiter = waiters.server_waiter(
+            client, CONF.compute.build_timeout,
+            interval=self.MIGRATION_POLL, all_tenants=True,
+            tenant_id=targets[0][0]['tenant_id'])
+        for server, _ in targets:
+            waiter.add(server['id'], 'ACTIVE')
+        finished = waiter.wait()
+        return dict((server_id, (start, finished[server_id]['reached']))
+                    for server_id, start in starts.items())
+
+    def _migration_downtime(self, probers, start, migrated, end):
+        """
+        :returns: per probe, the downtime during the whole window and how
+                  long the flows took to come back once the migration
+                  finished (0 when they never went down, None with
+                  not_recovered set when they were still down at end).
+                  migrated is only known within MIGRATION_POLL, a
+                  negative reestablished_s is that measurement error.
+        """
+        result = {}
+        for prober in probers:
+            summary = probing.downtime(prober.samples(), start, end)
+            recovered = summary.pop('recovered')
+            if summary['not_recovered']:
+                summary['reestablished_s'] = None
+            elif recovered is None:
+                summary['reestablished_s'] = 0.0
+            else:
+                summary['reestablished_s'] = round(recovered - migrated,
+                                                   2)
+            result[prober.name] = summary
+        return result
+
+    def _check_recovered(self, results, probe_names):
+        """
+        Fails unless the probes of every migration came back before the
+        end of its window
+        """
+        for result in results:
+            for name in probe_names:
+                self.assertFalse(result[name]['not_recovered'],
+                                 "%s probes to %s were still failing %ss "
+                                 "after the migration"
+                                 % (name, result['server'],
+                                    self.PROBE_MARGIN))
@@ -0,0 +1,183 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import time
+
+from tempest import config
+from tempest import exceptions
+from tempest import test
+
+from midokura.midotools import parallel
+from midokura.midotools import report
+from midokura.midotools import stats
+from midokura.scenario import manager
+from midokura.scenario.test_network_helper_lbaas import TestLoadBalancerHelper
+
+CONF = config.CONF
+LOG = manager.log.getLogger(__name__)
+SCPATH = "/network_scenarios/"
+
+
+class TestLoadBalancerScale(manager.AdvancedNetworkScenarioTest,
+                            TestLoadBalancerHelper):
+    """
+        Scenario:
+        Load balancing with many members and VIPs
+
+        Pre-requisites:
+        1 tenant
+        2 private networks
+        2 clients
+        24 VMs / backends
+
+        Steps:
+        1. Start the responder on every backend
+        2. Create VIPS pools, each one with all the backends as members
+           and a health monitor, the members and health monitors
+           concurrently
+        3. Create a VIP per pool on the client subnet
+        4. Request every VIP until it answers
+        5. Generate load on every VIP from both clients
+
+        Expected result:
+        every VIP answers and balances uniformly across the members. The
+        provisioning time of the API calls and until every resource is
+        ACTIVE, the time to the first answer of every VIP and the
+        distribution of the requests are attached to the test output as
+        JSON (and appended to MIDO_BENCHMARK_RESULTS)
+    """
+
+    VIPS = 3
+    # load requests per member and client, enough for the uniformity
+    # verdict to bound the share of 24 members (about 95 hits each)
+    REQUESTS_PER_MEMBER = 60
+
+    @classmethod
+    def resource_setup(cls):
+        super(TestLoadBalancerScale, cls).resource_setup()
+        cls.init_setup()
+        cls.builder = TestLoadBalancerScale(builder=True)
+        cls.servers_and_keys = cls.builder.setup_topology(
+            os.path.abspath('{0}scenario_scale_lbaas.yaml'.format(SCPATH)))
+        # Get the server acting as the gateway
+        cls.accesspoint = cls.servers_and_keys[-1]
+
+        clients_and_keys = [server
+                            for server in cls.servers_and_keys
+                            if 'client' in server['server']['name']]
+        net_name = clients_and_keys[0]['server']['addresses'].keys()[0]
+        net = cls.builder._get_network_by_name(net_name)[0]
+        vip_subnet_id = net['subnets'][0]
+        cls.request_clients = [cls.builder._get_remote_client(client)
+                               for client in clients_and_keys]
+        cls.request_client = cls.request_clients[0]
+
+        cls.members_and_keys = [server
+                                for server in cls.servers_and_keys
+                                if 'backend' in server['server']['name']]
+        members = []
+        subnet = None
+        for server in cls.members_and_keys:
+            net_name, net_host = server['server']['addresses'].items()[0]
+            if subnet is None:
+                net = cls.builder._get_network_by_name(net_name)[0]
+                subnet = cls.builder._list_subnets(id=net['subnets'][0])[0]
+            members.append((net_host[0]['addr'],
+                            server['server']['name'],
+                            server['server']['id']))
+        cls.pools = [dict(subnet=subnet,
+                          vip_subnet_id=vip_subnet_id,
+                          members=list(members))
+                     for _ in range(cls.VIPS)]
+
+    def _get_remote_client(self, server):
+        ap_ip = self.accesspoint['FIP'].floating_ip_address
+        ap_key = self.accesspoint['keypair']['private_key']
+        net_name = server['server']['addresses'].keys()[0]
+        host_ip = server['server']['addresses'][net_name][0]['addr']
+        host_key = server['keypair']['private_key']
+        hops = [(ap_ip, ap_key), (host_ip, host_key)]
+        linux_client = self.setup_tunnel(hops)
+        return linux_client
+
+    def _make_client_request(self, command):
+        return self.request_client.exec_command(command, 5).rstrip()
+
+    def _get_load_clients(self):
+        return [client.exec_command for client in self.request_clients]
+
+    def _time_to_first_request(self):
+        """
+        Requests every VIP in turn until all of them answered once
+        :returns: the seconds from the creation of every VIP to its first
+                  answer, by VIP address
+        """
+        timeout = CONF.compute.ping_timeout
+        first = {}
+        pending = list(self.pools)
+        start = time.time()
+        while pending:
+            for pool_dict in list(pending):
+                vip = pool_dict['vip']
+                if self._connect_to_server(vip.address):
+                    first[vip.address] = round(
+                        time.time() - pool_dict['vip_created'], 2)
+                    pending.remove(pool_dict)
+            if not pending:
+                break
+            if time.time() - start > timeout:
+                message = "Timeout waiting for the VIPs %s to answer" % (
+                    [pool_dict['vip'].address for pool_dict in pending])
+                raise exceptions.TimeoutException(message)
+            time.sleep(1)
+        return first
+
+    def _check_uniformity(self, pool_dict):
+        members = pool_dict['members']
+        result = self._generate_load(
+            pool_dict['vip'], members,
+            requests=self.REQUESTS_PER_MEMBER * len(members))
+        counts = result['hits'].values()
+        result.update(vip=pool_dict['vip'].address,
+                      chi_square=round(stats.chi_square(counts), 2)
+                      if sum(counts) else None,
+                      uniform=stats.uniformity_verdict(
+                          counts, self.significance, self.balance_tolerance))
+        return result
+
+    @test.attr(type='benchmark')
+    @test.services('compute', 'network')
+    def test_network_lbaas_scale(self):
+        self.backends = {}
+        parallel.run_concurrently(self._start_server, self.members_and_keys,
+                                  workers=manager.API_WORKERS)
+        provisioning = self._create_load_balancers(self.pools, 'ROUND_ROBIN',
+                                                   health_monitor=True)
+        first_request = self._time_to_first_request()
+        balancing = [self._check_uniformity(pool_dict)
+                     for pool_dict in self.pools]
+        report.publish(self, 'lbaas_scale',
+                       dict(vips=len(self.pools),
+                            members=len(self.members_and_keys),
+                            provisioning=provisioning,
+                            first_request_s=first_request,
+                            balancing=balancing))
+        for result in balancing:
+            self.assertIsNotNone(result['uniform'],
+                                 "No evidence of a uniform balancing on "
+                                 "VIP %s: %s" % (result['vip'],
+                                                 result['hits']))
+            self.assertTrue(result['uniform'],
+                            "VIP %s did not balance uniformly: %s"
+                            % (result['vip'], result['hits']))
+        LOG.info("test finished, tearing down now ....")
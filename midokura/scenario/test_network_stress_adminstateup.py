@@ -0,0 +1,106 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import functools
+import os
+
+from tempest import config
+from tempest import test
+
+from midokura.midotools import report
+from midokura.midotools import stats
+from midokura.scenario import manager
+from midokura.scenario.test_network_helper_adminstateup import TestAdminStateUpHelper
+
+CONF = config.CONF
+LOG = manager.log.getLogger(__name__)
+
+# path should be described in tempest.conf
+SCPATH = "/network_scenarios/"
+
+
+class TestAdminStateUpStress(manager.AdvancedNetworkScenarioTest,
+                             TestAdminStateUpHelper):
+    """
+        Scenario:
+            port admin_state_up flap storm
+        Prerequisite:
+            1 tenant
+            1 network behind a public router
+            8 VMs with FIP
+        Steps:
+            1) ping the FIPs continuously from the exterior
+            2) set the ports of all the VMs down and up at the same
+               time, FLAP_ROUNDS times
+        Expected result:
+            every FIP stops answering once its port is down and answers
+            again once it is up. The time from the update of each port
+            returning to its probes failing for good (down) and
+            answering again (up), with their distribution, is attached
+            to the test output as JSON (and appended to
+            MIDO_BENCHMARK_RESULTS)
+    """
+
+    FLAP_ROUNDS = 3
+
+    @classmethod
+    def resource_setup(cls):
+        super(TestAdminStateUpStress, cls).resource_setup()
+        cls.builder = TestAdminStateUpStress(builder=True)
+        cls.servers_and_keys = cls.builder.setup_topology(
+            os.path.abspath(
+                '{0}scenario_stress_adminstateup.yaml'.format(SCPATH)))
+
+    def _check_connection(self, server, should_connect=True):
+        ssh_login = CONF.compute.image_ssh_user
+        ip_address = server['FIP'].floating_ip_address
+        private_key = server['keypair']['private_key']
+        self.check_public_network_connectivity(
+            ip_address, ssh_login, private_key, should_connect)
+
+    @test.attr(type='benchmark')
+    @test.services('compute', 'network')
+    def test_network_adminstateup_port_flap_storm(self):
+        LOG.info("Starting Port flap storm test")
+        port_ids = [server['FIP'].get("port_id")
+                    for server in self.servers_and_keys]
+        for port_id in port_ids:
+            self.addCleanup(self.network_client.update_port,
+                            port_id, admin_state_up=True)
+        # one prober per port, in the same order
+        probers = self._start_probers(self.servers_and_keys)
+        rounds = []
+        try:
+            for _ in range(self.FLAP_ROUNDS):
+                rounds.append(self._toggle(
+                    functools.partial(self._set_ports_state, port_ids),
+                    probers))
+        finally:
+            for prober in probers:
+                prober.stop()
+        toggles = [toggle for results in rounds for toggle in results]
+        report.publish(self, 'adminstateup_port_flap_storm', dict(
+            ports=len(port_ids),
+            rounds=rounds,
+            down_s=stats.summarize([toggle['down_s'] for toggle in toggles
+                                    if toggle['down_s'] is not None]),
+            up_s=stats.summarize([toggle['up_s'] for toggle in toggles
+                                  if toggle['up_s'] is not None])))
+        for toggle in toggles:
+            self.assertIsNotNone(toggle['down_s'],
+                                 "%s kept answering with its port down"
+                                 % toggle['fip'])
+            self.assertIsNotNone(toggle['up_s'],
+                                 "%s did not answer with its port up"
+                                 % toggle['fip'])
+        self._check_connection(self.servers_and_keys[0], True)
+        LOG.info("End of Port flap storm test")
@@ -0,0 +1,171 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import testtools
+import time
+
+from tempest import config
+from tempest import test
+
+from midokura.midotools import report
+from midokura.scenario import manager
+from midokura.scenario.test_network_helper_live_migrate import TestLiveMigrateHelper
+
+LOG = manager.log.getLogger(__name__)
+SCPATH = "/network_scenarios/"
+CONF = config.CONF
+
+
+class TestNetworkStressLiveMigrate(manager.AdvancedNetworkScenarioTest,
+                                   TestLiveMigrateHelper):
+    """
+        Scenario:
+            Concurrent live migrations, port binding churn
+        Prerequisite:
+            1 tenant
+            1 network
+            8 vms with FIP to migrate and a peer
+        Steps:
+            1) spawn the VMs
+            2) start pinging every VM from the peer, and opening TCP
+               connections to their FIPs from the exterior
+            3) live migrate all the VMs at the same time to the next
+               compute host, ROUNDS times, so they ping-pong between
+               the hosts
+        Expected result:
+            every migration ends on its target host and the probes to
+            the VM succeed again within PROBE_MARGIN. The duration and
+            network downtime of every migration are attached to the test
+            output as JSON (and appended to MIDO_BENCHMARK_RESULTS)
+    """
+
+    ROUNDS = 3
+    # migrations in flight at the same time
+    CONCURRENCY = 8
+
+    @classmethod
+    def resource_setup(cls):
+        super(TestNetworkStressLiveMigrate, cls).resource_setup()
+        cls.builder = TestNetworkStressLiveMigrate(builder=True)
+        cls.servers_and_keys = cls.builder.setup_topology(
+            os.path.abspath(
+                '{0}scenario_stress_live_migrate.yaml'.format(SCPATH)))
+
+    def _migrate_round(self, targets):
+        """
+        Migrates the servers at the same time, waiting for all of them
+        with a single waiter
+        :param targets: (server_def, target host) pairs
+        :returns: per target, dict with the server, hosts and the times
+                  the migration started and finished
+        """
+        source_hosts = [self._get_host_for_server(server_def['server']['id'])
+                        for server_def, _ in targets]
+        times = self._migrate_servers(
+            [(server_def['server'], target_host)
+             for server_def, target_host in targets],
+            workers=self.CONCURRENCY)
+        migrations = []
+        for (server_def, target_host), source_host in zip(targets,
+                                                          source_hosts):
+            server = server_def['server']
+            start, migrated = times[server['id']]
+            migrations.append(dict(
+                server_def=server_def,
+                source_host=source_host,
+                target_host=target_host,
+                host=self._get_host_for_server(server['id']),
+                start=start,
+                migrated=migrated))
+        return migrations
+
+    def _next_host(self, hosts, server):
+        current = self._get_host_for_server(server['id'])
+        self.assertIn(current, hosts,
+                      "%s is on %s, not one of the compute hosts %s"
+                      % (server['name'], current, hosts))
+        return hosts[(hosts.index(current) + 1) % len(hosts)]
+
+    def _check_reestablished(self, server_probers, migration):
+        """
+        Fails unless the last probe of every kind within PROBE_MARGIN of
+        the end of the migration succeeded
+        """
+        migrated = migration['migrated']
+        for prober in server_probers:
+            after = [result for when, result in prober.samples()
+                     if migrated <= when < migrated + self.PROBE_MARGIN]
+            self.assertTrue(after and after[-1] is not None,
+                            "%s probes to %s had not recovered %ss after "
+                            "its migration to %s"
+                            % (prober.name,
+                               migration['server_def']['server']['name'],
+                               self.PROBE_MARGIN, migration['target_host']))
+
+    @testtools.skipUnless(CONF.compute_feature_enabled.live_migration,
+                          'Live migration not available')
+    @test.attr(type='benchmark')
+    @test.services('compute', 'network')
+    def test_network_stress_live_migrate(self):
+        hosts = sorted(self._get_compute_hostnames())
+        if len(hosts) < 2:
+            raise self.skipTest(
+                "Less than 2 compute nodes, skipping migration test.")
+
+        peer_def = next(server_def for server_def in self.servers_and_keys
+                        if 'peer' in server_def['server']['name'])
+        servers = [server_def for server_def in self.servers_and_keys
+                   if server_def is not peer_def]
+        # an ssh connection to the peer per VM, they probe in parallel
+        probers = dict(
+            (server_def['server']['id'],
+             self._start_probes(server_def,
+                                self._get_peer_client(peer_def)))
+            for server_def in servers)
+        migrations = []
+        try:
+            time.sleep(self.PROBE_MARGIN)
+            for round_number in range(self.ROUNDS):
+                targets = [(server_def,
+                            self._next_host(hosts, server_def['server']))
+                           for server_def in servers]
+                migrations.extend(self._migrate_round(targets))
+                time.sleep(self.PROBE_MARGIN)
+        finally:
+            for server_probers in probers.values():
+                for prober in server_probers:
+                    prober.stop()
+
+        results = []
+        for migration in migrations:
+            server = migration['server_def']['server']
+            result = self._migration_downtime(
+                probers[server['id']], migration['start'],
+                migration['migrated'],
+                migration['migrated'] + self.PROBE_MARGIN)
+            result.update(server=server['name'],
+                          source_host=migration['source_host'],
+                          target_host=migration['target_host'],
+                          duration_s=round(migration['migrated'] -
+                                           migration['start'], 2),
+                          resolution_s=self.MIGRATION_POLL)
+            results.append(result)
+        report.publish(self, 'live_migration_stress', results)
+        for migration in migrations:
+            self.assertEqual(migration['target_host'], migration['host'],
+                             "%s did not migrate to %s"
+                             % (migration['server_def']['server']['name'],
+                                migration['target_host']))
+            self._check_reestablished(
+                probers[migration['server_def']['server']['id']], migration)
+        LOG.info("test finished, tearing down now ....")
@@ -0,0 +1,227 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Generator of large scenario topologies.
+
+Builds the same structure as the hand written network_scenarios/ files
+from a handful of parameters, allocating non-overlapping subnets so the
+output is reproducible and can be fed to setup_topology (or dumped to a
+YAML file) directly.
+
+example usage:
+    $ python -m midokura.scenario.topology_generator --tenants 2 \\
+        --routers 5 --networks 4 --vms 10 --fip-ratio 0.1 \\
+        -o scenario_scale.yaml
+"""
+
+import argparse
+import socket
+import struct
+import sys
+
+import yaml
+
+from midokura.scenario import scenario_registry
+
+
+class CidrAllocator(object):
+    """
+    Hands out consecutive, non-overlapping blocks of a base network
+    """
+
+    def __init__(self, base='10.0.0.0/8', prefix=24):
+        address, base_prefix = base.split('/')
+        base_prefix = int(base_prefix)
+        if not base_prefix <= prefix <= 30:
+            raise ValueError("Cannot allocate /%d blocks from %s"
+                             % (prefix, base))
+        mask = (0xffffffff << (32 - base_prefix)) & 0xffffffff
+        self.start = self._to_int(address) & mask
+        self.end = self.start + (1 << (32 - base_prefix))
+        self.prefix = prefix
+        self.size = 1 << (32 - prefix)
+        self.next = self.start
+
+    @staticmethod
+    def _to_int(address):
+        return struct.unpack('!I', socket.inet_aton(address))[0]
+
+    @staticmethod
+    def _to_str(address):
+        return socket.inet_ntoa(struct.pack('!I', address))
+
+    @property
+    def hosts(self):
+        # network, broadcast, router interface and dhcp port
+        return self.size - 4
+
+    def allocate(self):
+        if self.next + self.size > self.end:
+            raise ValueError("No more /%d blocks left" % self.prefix)
+        cidr = "%s/%d" % (self._to_str(self.next), self.prefix)
+        self.next += self.size
+        return cidr
+
+
+def _security_group(name, rules):
+    # the first two rules keep the servers reachable from the gateway
+    rule_list = [{'protocol': 'tcp',
+                  'port_range_min': 22,
+                  'port_range_max': 22},
+                 {'protocol': 'icmp'}][:rules]
+    for i in range(len(rule_list), rules):
+        rule_list.append({'protocol': 'tcp',
+                          'port_range_min': 10000 + i,
+                          'port_range_max': 10000 + i})
+    return {'name': name,
+            'description': 'generated, %d rules' % rules,
+            'security_group_rules': rule_list}
+
+
+def _tenant_topology(cidrs, name, routers, networks, vms, sg_rules,
+                     fip_ratio, public_routers, gateway):
+    topology = {
+        'name': name,
+        'routers': [],
+        'networks': [],
+        'servers': [],
+        'security_groups': [_security_group('scale', sg_rules)],
+        'gateway': gateway,
+    }
+    fips = int(round(vms * fip_ratio))
+    # the builder looks resources up by name prefix: zero padded indexes
+    # keep net-0-1 from matching net-0-10
+    r_width = len(str(routers - 1))
+    n_width = len(str(networks - 1))
+    for r in range(routers):
+        router = 'router-%0*d' % (r_width, r)
+        topology['routers'].append({'name': router,
+                                    'public': public_routers})
+        for n in range(networks):
+            index = '%0*d-%0*d' % (r_width, r, n_width, n)
+            network = 'net-%s' % index
+            topology['networks'].append({
+                'name': network,
+                'subnets': [{'name': 'subnet-%s' % index,
+                             'cidr': cidrs.allocate(),
+                             'routers': [router]}]})
+            for quantity, floating_ip in [(fips, True), (vms - fips, False)]:
+                if not quantity:
+                    continue
+                topology['servers'].append({
+                    'name': 'vm-%s%s' % (index, '-fip' if floating_ip
+                                          else ''),
+                    'networks': [{'name': network}],
+                    'security_groups': [{'name': 'scale'}],
+                    'floating_ip': floating_ip,
+                    'quantity': quantity})
+    return topology
+
+
+def generate(tenants=1, routers=1, networks=1, vms=1, sg_rules=2,
+             fip_ratio=0.0, public_routers=None, gateway=False,
+             base_cidr='10.0.0.0/8', prefix=24):
+    """
+    :param tenants: number of tenants, more than one generates a
+    multi tenant scenario (each tenant gets its own scenario)
+    :param routers: routers per tenant
+    :param networks: networks (with one subnet) per router
+    :param vms: servers per network
+    :param sg_rules: rules of the security group all the servers use
+    :param fip_ratio: fraction of the servers of each network with a FIP
+    :param public_routers: routers with external gateway, defaults to
+    True when there are floating ips
+    :param gateway: add an access point to every tenant
+    :returns: the compiled topology, as the registry returns it
+    """
+    if not 0.0 <= fip_ratio <= 1.0:
+        raise ValueError("fip_ratio must be between 0 and 1")
+    if public_routers is None:
+        public_routers = fip_ratio > 0
+    if fip_ratio > 0 and not public_routers:
+        raise ValueError("Floating ips need public routers")
+    cidrs = CidrAllocator(base_cidr, prefix)
+    if vms > cidrs.hosts:
+        raise ValueError("%d servers do not fit in a /%d subnet"
+                         % (vms, prefix))
+
+    scenarios = [_tenant_topology(cidrs, 'scale-%d' % t, routers, networks,
+                                  vms, sg_rules, fip_ratio, public_routers,
+                                  gateway)
+                 for t in range(tenants)]
+    if tenants == 1:
+        topology = scenarios[0]
+    else:
+        topology = {
+            'tenants': [{'name': 'tenant-scale-%d' % t,
+                         'description': 'generated tenant',
+                         'scenario': scenario['name']}
+                        for t, scenario in enumerate(scenarios)],
+            'scenarios': scenarios,
+        }
+    return scenario_registry.compile_topology(topology, 'generated')
+
+
+def _strip_nulls(value):
+    # the compiled topology has every optional key, keep the YAML short
+    if isinstance(value, dict):
+        return dict((k, _strip_nulls(v)) for k, v in value.items()
+                    if v is not None)
+    if isinstance(value, list):
+        return [_strip_nulls(v) for v in value]
+    return value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Generate a scenario YAML for scale tests")
+    parser.add_argument('--tenants', type=int, default=1)
+    parser.add_argument('--routers', type=int, default=1,
+                        help="routers per tenant")
+    parser.add_argument('--networks', type=int, default=1,
+                        help="networks per router")
+    parser.add_argument('--vms', type=int, default=1,
+                        help="servers per network")
+    parser.add_argument('--sg-rules', type=int, default=2,
+                        help="rules in the security group")
+    parser.add_argument('--fip-ratio', type=float, default=0.0,
+                        help="fraction of servers with a floating ip")
+    parser.add_argument('--gateway', action='store_true',
+                        help="add an access point per tenant")
+    parser.add_argument('--base-cidr', default='10.0.0.0/8')
+    parser.add_argument('--prefix', type=int, default=24,
+                        help="prefix length of every subnet")
+    parser.add_argument('-o', '--output',
+                        help="write the YAML here instead of stdout")
+    args = parser.parse_args(argv)
+
+    topology = generate(tenants=args.tenants,
+                        routers=args.routers,
+                        networks=args.networks,
+                        vms=args.vms,
+                        sg_rules=args.sg_rules,
+                        fip_ratio=args.fip_ratio,
+                        gateway=args.gateway,
+                        base_cidr=args.base_cidr,
+                        prefix=args.prefix)
+    output = yaml.safe_dump(_strip_nulls(topology), default_flow_style=False)
+    if args.output:
+        with open(args.output, 'w') as yaml_file:
+            yaml_file.write(output)
+    else:
+        sys.stdout.write(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
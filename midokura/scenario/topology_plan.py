@@ -0,0 +1,409 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Dry-run planner for the scenario YAML topologies.
+
+Expands a scenario the same way AdvancedNetworkScenarioTest.setup_topology
+does (tenants, server quantity, gateway) but, instead of calling the APIs,
+records the ordered list of calls and the dependencies between them.
+With a table of per-call latencies it estimates the wall-clock cost of the
+builder (tenants in parallel, the calls of each tenant one after another)
+and the critical path, i.e. the cost if every independent call was issued
+in parallel.
+
+example usage:
+    $ python -m midokura.scenario.topology_plan scenario_basic_2nets.yaml \\
+        --tempest-log tempest.log
+"""
+
+import argparse
+import collections
+import re
+import sys
+
+import yaml
+
+from midokura.scenario import scenario_registry
+
+
+# Rough mean latencies (seconds) for a devstack-like deployment. They are
+# only used for the calls that were not found in the recorded latencies.
+DEFAULT_LATENCIES = {
+    'create_project': 0.3,
+    'create_user': 0.3,
+    'assign_role': 0.2,
+    'create_router': 0.6,
+    'set_router_gateway': 0.8,
+    'create_network': 0.5,
+    'create_subnet': 0.6,
+    'add_router_interface': 1.0,
+    'list_networks': 0.2,
+    'list_security_groups': 0.2,
+    'list_ports': 0.2,
+    'create_bulk_port': 0.8,
+    'create_security_group': 0.3,
+    'create_security_group_rule': 0.2,
+    'create_keypair': 0.5,
+    'create_server': 1.5,
+    'wait_server_active': 20.0,
+    'wait_servers_active': 20.0,
+    'create_floatingip': 0.8,
+    'attach_interface': 3.0,
+    'cirros_dhcp_fixup': 5.0,
+}
+
+# Maps the requests logged by the tempest rest client to our call names
+REQUEST_CALLS = [
+    ('POST', r'/(v2.0/)?tenants$|/projects$', 'create_project'),
+    ('POST', r'/users$', 'create_user'),
+    ('PUT', r'/roles/(OS-KSADM/)?[^/]+$', 'assign_role'),
+    ('POST', r'/routers$', 'create_router'),
+    ('PUT', r'/routers/[^/]+/add_router_interface$', 'add_router_interface'),
+    ('PUT', r'/routers/[^/]+$', 'set_router_gateway'),
+    ('POST', r'/networks$', 'create_network'),
+    ('POST', r'/subnets$', 'create_subnet'),
+    ('GET', r'/networks(\?.*)?$', 'list_networks'),
+    ('GET', r'/security-groups(\?.*)?$', 'list_security_groups'),
+    ('GET', r'/ports(\?.*)?$', 'list_ports'),
+    ('POST', r'/ports$', 'create_bulk_port'),
+    ('POST', r'/security-groups$', 'create_security_group'),
+    ('POST', r'/security-group-rules$', 'create_security_group_rule'),
+    ('POST', r'/os-keypairs$', 'create_keypair'),
+    ('POST', r'/servers$', 'create_server'),
+    ('POST', r'/floatingips$', 'create_floatingip'),
+    ('POST', r'/servers/[^/]+/os-interface$', 'attach_interface'),
+]
+
+# Request (TestFoo:setUpClass): 201 POST http://host:9696/v2.0/networks 0.512s
+REQUEST_LOG_RE = re.compile(
+    r'Request \([^)]*\): \d+ (?P<method>[A-Z]+) (?P<url>\S+) '
+    r'(?P<elapsed>[0-9.]+)s')
+
+
+class Step(object):
+
+    def __init__(self, index, call, resource, deps):
+        self.index = index
+        self.call = call
+        self.resource = resource
+        self.deps = deps
+
+    def __repr__(self):
+        return "%-4d %-28s %-40s deps=%s" % (self.index, self.call,
+                                             self.resource, self.deps)
+
+
+class TopologyPlan(object):
+    """
+    Ordered list of API calls, in the order the builder issues them,
+    together with the calls each one needs to have completed first.
+    """
+
+    def __init__(self):
+        self.steps = []
+
+    def add(self, call, resource, deps=()):
+        step = Step(len(self.steps), call, resource,
+                    sorted(set(d for d in deps if d is not None)))
+        self.steps.append(step)
+        return step.index
+
+    def call_counts(self):
+        return collections.Counter(step.call for step in self.steps)
+
+    def serial_time(self, latencies):
+        return sum(latencies.get(step.call) for step in self.steps)
+
+    def builder_time(self, latencies):
+        """
+        setup_topology builds every tenant from its own thread, the
+        resources of a tenant are created serially
+        """
+        tenants = collections.defaultdict(float)
+        for step in self.steps:
+            tenants[step.resource.split('/')[0]] += latencies.get(step.call)
+        return max(tenants.values()) if tenants else 0.0
+
+    def critical_path(self, latencies):
+        """
+        :returns: (seconds, steps) of the longest dependency chain
+        """
+        finish = []
+        previous = []
+        for step in self.steps:
+            # steps are appended after their dependencies, so a single
+            # pass in index order is a valid topological traversal
+            start, before = 0.0, None
+            for dep in step.deps:
+                if finish[dep] > start:
+                    start, before = finish[dep], dep
+            finish.append(start + latencies.get(step.call))
+            previous.append(before)
+        if not self.steps:
+            return 0.0, []
+        last = max(range(len(finish)), key=lambda i: finish[i])
+        path = []
+        while last is not None:
+            path.append(self.steps[last])
+            last = previous[last]
+        path.reverse()
+        return finish[path[-1].index], path
+
+    def time_by_call(self, latencies):
+        times = collections.defaultdict(float)
+        for step in self.steps:
+            times[step.call] += latencies.get(step.call)
+        return times
+
+
+class LatencyTable(object):
+    """
+    Per-call mean latencies, seeded with DEFAULT_LATENCIES and overridden
+    with the recorded ones (a YAML mapping call: seconds, or the request
+    lines of a tempest.log).
+    """
+
+    def __init__(self, latencies=None):
+        self.latencies = dict(DEFAULT_LATENCIES)
+        self.latencies.update(latencies or {})
+
+    def get(self, call):
+        return self.latencies.get(call, 0.0)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'r') as latency_file:
+            return cls(yaml.safe_load(latency_file))
+
+    @classmethod
+    def from_tempest_log(cls, path):
+        samples = collections.defaultdict(list)
+        with open(path, 'r') as log_file:
+            for line in log_file:
+                match = REQUEST_LOG_RE.search(line)
+                if not match:
+                    continue
+                url = match.group('url').split('://', 1)[-1]
+                for method, pattern, call in REQUEST_CALLS:
+                    if (match.group('method') == method and
+                            re.search(pattern, url)):
+                        samples[call].append(float(match.group('elapsed')))
+                        break
+        return cls(dict((call, sum(values) / len(values))
+                        for call, values in samples.items()))
+
+
+def _plan_tenant(plan, topology, tenant, creds=None):
+    routers = {}
+    for router_def in topology['routers']:
+        resource = '%s/router:%s' % (tenant, router_def['name'])
+        router = plan.add('create_router', resource, [creds])
+        if router_def['public']:
+            router = plan.add('set_router_gateway', resource, [router])
+        routers[router_def['name']] = router
+
+    networks = {}
+    for network in topology['networks']:
+        resource = '%s/network:%s' % (tenant, network['name'])
+        net = plan.add('create_network', resource, [creds])
+        ready = [net]
+        for subnet_def in network['subnets']:
+            subnet = plan.add('create_subnet', '%s/subnet:%s'
+                              % (tenant, subnet_def['name']), [net])
+            ready.append(subnet)
+            for router in subnet_def['routers']:
+                ready.append(plan.add('add_router_interface',
+                                      '%s/router:%s' % (tenant, router),
+                                      [subnet, routers.get(router)]))
+        networks[network['name']] = ready
+
+    secgroups = {}
+    for secgroup in topology['security_groups']:
+        resource = '%s/security_group:%s' % (tenant, secgroup['name'])
+        lookup = plan.add('list_security_groups', resource, [creds])
+        if secgroup['name'] == 'default':
+            secgroups[secgroup['name']] = [lookup]
+            continue
+        sg = plan.add('create_security_group', resource, [lookup])
+        ready = [sg]
+        for _ in secgroup['security_group_rules']:
+            for direction in ['ingress', 'egress']:
+                ready.append(plan.add('create_security_group_rule',
+                                      '%s/%s' % (resource, direction), [sg]))
+        secgroups[secgroup['name']] = ready
+
+    if topology['servers'] or topology['gateway']:
+        # one keypair shared by all the servers of the tenant
+        keypair = plan.add('create_keypair', '%s/keypair' % tenant, [creds])
+    booted = []
+    for server in topology['servers']:
+        name = server['name']
+        deps = []
+        for snet in server['networks']:
+            deps.append(plan.add('list_networks', '%s/network:%s'
+                                 % (tenant, snet['name']),
+                                 networks.get(snet['name'], [])))
+        for sg in server['security_groups']:
+            deps.append(plan.add('list_security_groups',
+                                 '%s/security_group:%s' % (tenant, sg['name']),
+                                 secgroups.get(sg['name'], [])))
+        # the ports of all the replicas are created in one request, and
+        # the floating ips don't need to wait for the servers
+        ports = plan.add('create_bulk_port', '%s/ports:%s' % (tenant, name),
+                         deps)
+        for x in range(server['quantity']):
+            resource = '%s/server:%s-%d' % (tenant, name, x)
+            fip = None
+            if server['floating_ip']:
+                fip = plan.add('create_floatingip', resource + '/floating_ip',
+                               [ports])
+            booted.append((resource, len(server['networks']), fip,
+                           plan.add('create_server', resource,
+                                    [ports, keypair])))
+    if booted:
+        # all the servers of the tenant are waited for at once
+        active = plan.add('wait_servers_active', '%s/servers' % tenant,
+                          [server for _, _, _, server in booted])
+        for resource, nics, fip, _ in booted:
+            _plan_cirros_fixup(plan, resource, nics, fip, active)
+
+    if topology['gateway']:
+        # The access point is booted the first time the tenant needs it
+        # (planned here), later scenarios only attach it to their networks
+        resource = '%s/access_point' % tenant
+        net = plan.add('create_network', resource + '/network', [creds])
+        subnet = plan.add('create_subnet', resource + '/subnet', [net])
+        router = plan.add('create_router', resource + '/router', [creds])
+        router = plan.add('set_router_gateway', resource + '/router',
+                          [router])
+        interface = plan.add('add_router_interface', resource + '/router',
+                             [router, subnet])
+        sg = plan.add('create_security_group', resource + '/security_group',
+                      [creds])
+        rules = [plan.add('create_security_group_rule',
+                          resource + '/security_group', [sg])
+                 for _ in range(2)]
+        fip = _plan_server(plan, resource + '/server',
+                           [interface, keypair] + rules, 1, lookup_fip=True)
+        # attached to the networks of the scenario only
+        attached = [plan.add('attach_interface', resource + '/' + name,
+                             networks[name] + [fip])
+                    for name in sorted(networks)]
+        plan.add('cirros_dhcp_fixup', resource + '/server', attached)
+
+
+def _plan_server(plan, resource, deps, nics, fip=None, lookup_fip=False):
+    """
+    :param fip: step of the floating ip created before the server
+    :param lookup_fip: create the floating ip once the server is active
+    """
+    server = plan.add('create_server', resource, deps)
+    active = plan.add('wait_server_active', resource, [server])
+    if lookup_fip:
+        port = plan.add('list_ports', resource, [active])
+        fip = plan.add('create_floatingip', resource + '/floating_ip', [port])
+    _plan_cirros_fixup(plan, resource, nics, fip, active)
+    return fip
+
+
+def _plan_cirros_fixup(plan, resource, nics, fip, active):
+    if fip is not None:
+        # FIXME: when cirros is gone, see _fix_access_point
+        for _ in range(1, nics):
+            plan.add('cirros_dhcp_fixup', resource, [fip, active])
+
+
+def build_plan(topology):
+    """
+    Builds the TopologyPlan for an already parsed scenario
+    """
+    plan = TopologyPlan()
+    if 'tenants' in topology:
+        for tenant in topology['tenants']:
+            project = plan.add('create_project', tenant['name'])
+            user = plan.add('create_user', tenant['name'], [project])
+            creds = plan.add('assign_role', tenant['name'], [user])
+            topo = [x for x in topology['scenarios']
+                    if x['name'] == tenant['scenario']][0]
+            _plan_tenant(plan, topo, tenant['name'], creds)
+    else:
+        _plan_tenant(plan, topology, 'tenant')
+    return plan
+
+
+def load_plan(yaml_topology):
+    return build_plan(scenario_registry.registry.load(yaml_topology))
+
+
+def format_report(plan, latencies, verbose=True):
+    lines = []
+    if verbose:
+        lines.append("Ordered API calls:")
+        lines.extend(repr(step) for step in plan.steps)
+        lines.append("")
+    serial = plan.serial_time(latencies)
+    builder = plan.builder_time(latencies)
+    critical, path = plan.critical_path(latencies)
+    lines.append("API calls:              %d" % len(plan.steps))
+    lines.append("Critical path:          %d calls" % len(path))
+    lines.append("Serial time:            %.1fs" % serial)
+    lines.append("Estimated builder time: %.1fs" % builder)
+    lines.append("Critical path time:     %.1fs" % critical)
+    if critical:
+        lines.append("Max parallel speedup:   %.1fx" % (builder / critical))
+    lines.append("")
+    lines.append("%-28s %6s %10s" % ("call", "count", "seconds"))
+    counts = plan.call_counts()
+    times = plan.time_by_call(latencies)
+    for call in sorted(times, key=times.get, reverse=True):
+        lines.append("%-28s %6d %10.1f" % (call, counts[call], times[call]))
+    lines.append("")
+    lines.append("Critical path:")
+    lines.extend("  %s %s" % (step.call, step.resource) for step in path)
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Dry-run a scenario YAML: list the API calls it "
+                    "needs and estimate how long the setup takes")
+    parser.add_argument('scenario', help="scenario YAML file")
+    parser.add_argument('--latencies',
+                        help="YAML mapping of call name to mean seconds")
+    parser.add_argument('--tempest-log',
+                        help="tempest.log to take the call latencies from")
+    parser.add_argument('--budget', type=float,
+                        help="fail if the builder estimate exceeds it (s)")
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help="only print the summary")
+    args = parser.parse_args(argv)
+
+    if args.tempest_log:
+        latencies = LatencyTable.from_tempest_log(args.tempest_log)
+    elif args.latencies:
+        latencies = LatencyTable.from_file(args.latencies)
+    else:
+        latencies = LatencyTable()
+    try:
+        plan = load_plan(args.scenario)
+    except scenario_registry.ScenarioError as e:
+        print("Invalid scenario: %s" % e)
+        return 2
+    print(format_report(plan, latencies, verbose=not args.quiet))
+    if args.budget and plan.builder_time(latencies) > args.budget:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())